@@ -1,25 +1,55 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, abort, jsonify
-import pandas as pd
-from werkzeug.security import check_password_hash
-from config.old_config import (
-    machine_configs,
-    machine_settings,
-    TOOL_PASSWORDS,
-    apply_free_custom_label_override,
-)
-from bs4 import BeautifulSoup
-import requests
+import numpy as np
 import re
 import time
 import os
+import sqlite3
+import sys
 import traceback, werkzeug
-from functools import lru_cache
-from typing import Dict, Tuple, Optional
+import hashlib
+import json
+import threading
+from typing import Optional
 from datetime import timedelta
-import time as _time
-from config import new_config
-from config import memo_config
-from config.new_config import NEW_TOOL_PASSWORD
+from werkzeug.middleware.proxy_fix import ProxyFix
+from types import MappingProxyType
+from config.compiled import load_config, stats as config_stats
+from config.overrides import apply_free_custom_label_override
+from config.settings import (
+    ANY_LABEL,
+    RANGE_FALLBACKS,
+    SettingsError,
+    normalize_legacy_settings,
+    normalize_settings,
+    parse_condition_label,
+)
+from datastore.cache import DatasetCache, ResultCache, SharedResultStore
+from datastore.columnar import ALL_DTYPES, LEGACY_DTYPES, bundle_path
+from datastore.cube import RANGE_FIELDS, Aggregate, ResultCube
+from datastore.dataset import Dataset
+from datastore.index import ScanQuery
+from datastore.plan import PlanBuilder, QueryPlan
+from datastore.registry import DatasetRegistry
+from auth.grants import GrantIndex
+from auth.ratelimit import MemoryBackend, RateLimiter, SQLiteBackend
+from auth.verify import VerifyBusy, VerifyPool
+from preview.cache import PreviewCache
+from preview.fetch import fetch_link_meta, is_http_link, is_memo_link
+from preview.prewarm import collect_urls
+from preview.store import DEFAULT_STORE_PATH, PreviewStore
+
+
+# =====================================================================
+# 設定（config.build のビルド済みファイルから機種単位で遅延展開）
+# =====================================================================
+old_config = load_config("old_config")
+new_config = load_config("new_config")
+memo_config = load_config("memo_config")
+
+machine_configs = old_config.machine_configs
+machine_settings = old_config.machine_settings
+TOOL_PASSWORDS = old_config.TOOL_PASSWORDS
+NEW_TOOL_PASSWORD = new_config.NEW_TOOL_PASSWORD
 
 
 # =====================================================================
@@ -44,8 +74,15 @@ LOCK_SECONDS = 5 * 60
 def _access_key(machine_key: str, plan_type: str) -> str:
     return f"{machine_key}:{plan_type}"
 
+# 利用権はクッキーに「索引の版 + ビット列」で持つ（機種が増えてもほぼ一定サイズ）
+ACCESS_GRANTS = GrantIndex(
+    _access_key(machine_key, plan_type)
+    for machine_key, plans in TOOL_PASSWORDS.items()
+    for plan_type in (plans or {})
+)
+
 def is_authorized(machine_key: str, plan_type: str) -> bool:
-    return session.get("tool_access", {}).get(_access_key(machine_key, plan_type), False)
+    return ACCESS_GRANTS.has(session.get("tool_access"), _access_key(machine_key, plan_type))
 
 
 # =====================================================================
@@ -55,30 +92,64 @@ def is_all_authorized() -> bool:
     return session.get("all_access", False)
 
 
+# =====================================================================
+# ログイン失敗のレートリミット（IP × 機種ごとのトークンバケット）
+# =====================================================================
+# ログイン失敗の記録はサーバー側（クッキーに積まない）
+# 既定はSQLiteファイルで全workerが共有する。RATE_LIMIT_DB=memory ならプロセス内（開発用）
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB", os.path.join(app.root_path, "data", "ratelimit.sqlite3"))
+LOGIN_LIMITER = RateLimiter(
+    MemoryBackend() if RATE_LIMIT_DB == "memory" else SQLiteBackend(RATE_LIMIT_DB),
+    capacity=MAX_TRIES,
+    refill_seconds=LOCK_SECONDS,
+)
 
-def _tries_key(key: str) -> str:
-    return f"tries:{key}"
+# 前段のプロキシ（Render のロードバランサ）の段数。X-Forwarded-For はこの段数分だけ信用し、
+# request.remote_addr を実際の接続元にする。既定の 0 は X-Forwarded-For を見ない
+# （直接つながる環境でヘッダーを変えてバケットを作り直せないように。Render は render.yaml で 1）
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
-def _lock_key(key: str) -> str:
-    return f"lock:{key}"
+def _limit_key(key: str) -> str:
+    return f"{request.remote_addr or ''}|{key}"
+
+# 記録先（SQLite）が開けない・ロック待ちで失敗したときは「制限なし」で通す（fail-open）。
+# パスワードの照合自体は行うので、障害中にログインできなくなるよりはこちらを取る。エラーはログに残す
+def _limiter_error(action: str, e: Exception) -> None:
+    print(f"[ratelimit] {action} failed, not limiting: {e}", file=sys.stderr)
 
 def is_locked(key: str) -> Optional[float]:
-    unlock_at = session.get(_lock_key(key))
-    if unlock_at and time.time() < unlock_at:
-        return unlock_at
-    session.pop(_lock_key(key), None)
-    return None
+    try:
+        return LOGIN_LIMITER.locked_until(_limit_key(key))
+    except sqlite3.Error as e:
+        _limiter_error("check", e)
+        return None
 
 def record_fail(key: str) -> None:
-    tries = session.get(_tries_key(key), 0) + 1
-    session[_tries_key(key)] = tries
-    if tries >= MAX_TRIES:
-        session[_lock_key(key)] = time.time() + LOCK_SECONDS
-        session[_tries_key(key)] = 0
+    try:
+        LOGIN_LIMITER.fail(_limit_key(key))
+    except sqlite3.Error as e:
+        _limiter_error("fail", e)
 
 def record_success(key: str) -> None:
-    session.pop(_tries_key(key), None)
-    session.pop(_lock_key(key), None)
+    try:
+        LOGIN_LIMITER.reset(_limit_key(key))
+    except sqlite3.Error as e:
+        _limiter_error("reset", e)
+
+# =====================================================================
+# パスワード検証（scryptは専用スレッドで同時実行数を絞る）
+# =====================================================================
+# 1 worker が同時に処理するリクエスト数（gunicorn.conf.py と同じ環境変数）。
+# 計算中 + 待ちを threads - 1 件までに抑え、ログインが集中しても検索用に1スレッド残す
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", "4"))
+VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", "2"))
+VERIFY_POOL = VerifyPool(
+    secret=app.secret_key.encode("utf-8"),
+    max_workers=VERIFY_WORKERS,
+    max_queue=int(os.environ.get("VERIFY_QUEUE", str(max(0, GUNICORN_THREADS - 1 - VERIFY_WORKERS)))),
+)
 
 # =====================================================================
 # ログインページ
@@ -135,10 +206,20 @@ def tool_login(machine_key, plan_type):
                                og_image=og_image,
                                tw_image=tw_image)
 
-    if check_password_hash(tool_pw_hash, input_pw):
-        access = session.get("tool_access", {})
-        access[key] = True
-        session["tool_access"] = access
+    try:
+        verified = VERIFY_POOL.verify(tool_pw_hash, input_pw)
+    except VerifyBusy:
+        # 混雑時は失敗回数に数えない
+        flash("ただいま混み合っています。少し待ってから再試行してください。")
+        return render_template("login.html",
+                               machine_key=machine_key,
+                               plan_type=plan_type,
+                               og_url=request.url,
+                               og_image=og_image,
+                               tw_image=tw_image)
+
+    if verified:
+        session["tool_access"] = ACCESS_GRANTS.grant(session.get("tool_access"), key)
         record_success(key)
         return redirect(url_for("machine_page", machine_key=machine_key, plan_type=plan_type))
     else:
@@ -186,148 +267,128 @@ def all_login():
 
 
 # =====================================================================
-# OGP / Twitter Card 取得（LRU+TTL）
+# OGP / Twitter Card 取得（裏で取得・URLごとのTTL）
 # =====================================================================
+def build_link_preview(url: str, machine_name: str, meta: Optional[dict]) -> dict:
+    """
+    メタ情報（無ければNone）→ 表示用dict（★フォールバック込み）
+    """
+    meta = meta or {}
+    return {
+        "url": url,
+        "title": meta.get("title") or f"{machine_name}｜攻略メモ",
+        "description": meta.get("description", ""),
+        "image": meta.get("image"),
+        "site_name": meta.get("site_name", "")
+    }
+
 def fetch_link_preview(url: str, machine_name: str = "攻略メモ", timeout: int = 6):
+    """
+    同期取得（失敗時はフォールバック表示）
+    """
     if not url:
         return None
 
-    # ★ memo系は固定表示（スクレイピングしない）
-    if "127.0.0.1" in url or "/memo/" in url:
-        return {
-            "url": url,
-            "title": f"{machine_name}｜攻略メモ",
-            "description": "",
-            "image": None,
-            "site_name": ""
-        }
+    if is_memo_link(url):
+        return build_link_preview(url, machine_name, None)
 
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        resp = requests.get(url, headers=headers, timeout=timeout)
-        resp.raise_for_status()
-
-        soup = BeautifulSoup(resp.text, "html.parser")
-
-        def pick(*names):
-            for n in names:
-                el = soup.find("meta", attrs={"property": n}) or soup.find("meta", attrs={"name": n})
-                if el and el.get("content"):
-                    return el["content"].strip()
-            return None
-
-        title = (
-            pick("og:title", "twitter:title")
-            or (soup.title.string.strip() if soup.title and soup.title.string else None)
-        )
-
-        desc  = pick("og:description", "twitter:description", "description")
-        image = pick("og:image", "twitter:image")
-        site  = pick("og:site_name", "twitter:site")
-
-        if image and image.startswith("//"):
-            image = "https:" + image
-
-        # ★フォールバック
-        if not title:
-            title = f"{machine_name}｜攻略メモ"
-
-        return {
-            "url": url,
-            "title": title,
-            "description": desc or "",
-            "image": image,
-            "site_name": site or ""
-        }
-
+        meta = fetch_link_meta(url, timeout=timeout)
     except Exception:
-        return {
-            "url": url,
-            "title": f"{machine_name}｜攻略メモ",
-            "description": "",
-            "image": None,
-            "site_name": ""
-        }
+        meta = None
 
-_PREVIEW_TTL = 60*60
+    return build_link_preview(url, machine_name, meta)
 
-@lru_cache(maxsize=64)
-def _cached_fetch_link_preview(url: str, machine_name: str):
-    data = fetch_link_preview(url, machine_name)
-    return (_time.time(), data)
+# 取得結果はSQLiteに保存し、worker・デプロイをまたいで使い回す（python -m preview.prewarm で事前取得）
+PREVIEW_DB = os.environ.get("PREVIEW_DB", os.path.join(app.root_path, DEFAULT_STORE_PATH))
+PREVIEW_CACHE = PreviewCache(fetch=fetch_link_meta, store=PreviewStore(PREVIEW_DB))
 
 def get_link_preview_cached(url: str, machine_name: str = "攻略メモ") -> Optional[dict]:
-    ts, data = _cached_fetch_link_preview(url, machine_name)
+    """
+    リクエスト中はネットワークを待たない。
+    未取得・失敗中はフォールバック表示を返し、取得は裏で行う。
+    """
+    if not url:
+        return None
 
-    if _time.time() - ts > _PREVIEW_TTL:
-        _cached_fetch_link_preview.cache_clear()
-        ts, data = _cached_fetch_link_preview(url, machine_name)
+    if is_memo_link(url) or not is_http_link(url):
+        return build_link_preview(url, machine_name, None)
 
-    return data
+    return build_link_preview(url, machine_name, PREVIEW_CACHE.get(url))
 
 # =====================================================================
 # CSV キャッシュ
 # =====================================================================
-DATA_CACHE: Dict[str, Tuple[float, pd.DataFrame]] = {}
-
-def load_csv_cached(path: str, dtypes: Optional[dict] = None, usecols: Optional[list] = None) -> pd.DataFrame:
-    mtime = os.path.getmtime(path)
-    cache = DATA_CACHE.get(path)
-    if cache and cache[0] == mtime:
-        return cache[1]
-    df = pd.read_csv(path, dtype=dtypes, usecols=usecols)
-    DATA_CACHE[path] = (mtime, df)
-    return df
+# 上限はMB単位（Renderの小さいインスタンスでもOOMしないように）
+DATA_CACHE_MAX_MB = int(os.environ.get("DATA_CACHE_MAX_MB", "256"))
+# 値は Dataset（索引・キューブ込みの nbytes で計測）
+DATA_CACHE = DatasetCache(max_bytes=DATA_CACHE_MAX_MB * 1024 * 1024)
+
+# データ差し替えの確認間隔（秒、0で監視しない）。監視は worker ごとのスレッドで行う
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", "5"))
+DATASETS = DatasetRegistry(DATA_CACHE, interval=DATA_RELOAD_INTERVAL)
+
+def load_dataset(path: str, dtypes: Optional[dict] = None) -> Dataset:
+    # 変換済みバンドル（python -m datastore.build）があればそちらを優先
+    # バンドルは読み取り専用mmapなので、DataFrameの実体はworker間で共有される
+    # 版の確認（stat）は DATASETS の監視スレッドが行い、ここでは辞書を引くだけ
+    return DATASETS.get(path, dtypes)
+
+def pin_machine_datasets(machine_key: str) -> None:
+    """
+    人気機種のデータをLRUの追い出し対象から外す（全モード分）
+    """
+    cfg = new_config.machine_configs.get(machine_key)
+    if not cfg:
+        return
+    for mode in cfg.get("settings", {}).get("mode_options", []):
+        DATA_CACHE.pin(f"data/{cfg['file_key']}/{mode_to_csv_suffix(mode)}.csv")
 
 # =====================================================================
-# 条件処理ユーティリティ
+# 旧ツールの条件（ラベルは config.settings で解釈済み）
 # =====================================================================
-def _normalize_range_str(s: str) -> str:
-    return s.replace(",", "").replace("枚", "").replace("G","").replace("連","").replace("スルー","").strip()
-
-def _to_numeric_condition(cond_str: str):
-    s = _normalize_range_str(cond_str)
-    if "～" in s:
-        low, high = s.split("～")
-        return ("between", int(low), int(high))
-    if s.endswith("以下"):
-        return ("le", int(s[:-2]), None)
-    if s.endswith("以上"):
-        return ("ge", int(s[:-2]), None)
-    return ("eq", int(s), None)
-
-def _apply_numeric_mask(series: pd.Series, cond_str: str) -> pd.Series:
-    op, a, b = _to_numeric_condition(cond_str)
-    if op == "between":
-        return series.between(a,b)
-    if op == "le":
-        return series.le(a)
-    if op == "ge":
-        return series.ge(a)
-    return series.eq(a)
-
-def filter_dataframe(df, form, settings):
-    exclude_games = settings["exclude_games"]
-    mask = pd.Series(True, index=df.index)
-    mask &= df["朝イチ"].eq(1 if form["time"]=="朝イチ" else 0)
-    if form["through"] != "不問":
-        mask &= _apply_numeric_mask(df["スルー回数"], form["through"])
-    if form["at_gap"] != "不問":
-        mask &= _apply_numeric_mask(df["AT間ゲーム数"], form["at_gap"])
-    if form["prev_game"] != "不問":
-        mask &= _apply_numeric_mask(df["前回当選ゲーム数"], form["prev_game"])
-    if form["prev_coin"] != "不問":
-        mask &= _apply_numeric_mask(df["前回獲得枚数"], form["prev_coin"])
-    if form["prev_diff"] != "不問":
-        mask &= _apply_numeric_mask(df["前回差枚数"], form["prev_diff"])
-    if form["prev_renchan"] != "不問":
-        mask &= _apply_numeric_mask(df["前回連荘数"], form["prev_renchan"])
-    if form.get("prev_type") != "不問" and "前回種別" in df.columns:
-        mask &= df["前回種別"].eq(form["prev_type"])
-    if form.get("custom_condition") not in (None,"不問") and "機種別条件" in df.columns:
-        mask &= _apply_numeric_mask(df["機種別条件"], form["custom_condition"])
-    mask &= df["当該REGゲーム数"].ge(int(form["game"]) + exclude_games)
-    return df.loc[mask]
+# フォーム項目 → CSV列
+LEGACY_CONDITION_COLUMNS = {
+    "through": "スルー回数",
+    "at_gap": "AT間ゲーム数",
+    "prev_game": "前回当選ゲーム数",
+    "prev_coin": "前回獲得枚数",
+    "prev_diff": "前回差枚数",
+    "prev_renchan": "前回連荘数",
+    "custom_condition": "機種別条件",
+}
+
+# 表示名 → 正規化済みsettings（初回アクセス時に機種ごとに生成、不正な設定の機種は除外）
+LEGACY_SETTINGS = machine_settings.derive(normalize_legacy_settings, reject=(SettingsError,))
+
+def legacy_csv_path(file_key: str, mode: str) -> str:
+    suffix = {"AT": "at", "CZ": "cz", "ST": "st"}.get(mode, "rb")
+    return f"data/{file_key}_{suffix}.csv"
+
+def apply_legacy_filters(q, form, settings, columns):
+    """
+    旧ツールのフォーム条件を q に積む（all_tool の apply_filters_v2 と同じ受け口）
+    """
+    conditions = settings["conditions"]
+    q.eq("朝イチ", 1 if form["time"]=="朝イチ" else 0)
+    for field, column in LEGACY_CONDITION_COLUMNS.items():
+        label = form.get(field)
+        if label in (None, ANY_LABEL):
+            continue
+        # 機種別条件の列がないCSVもある
+        if field == "custom_condition" and column not in columns:
+            continue
+        # 選択肢にないラベルだけここで解釈（結果は lru_cache）
+        op, *args = conditions[field].get(label) or parse_condition_label(label)
+        getattr(q, op)(column, *args)
+    if form.get("prev_type") != ANY_LABEL and "前回種別" in columns:
+        q.eq("前回種別", form.get("prev_type"))
+    q.ge("当該REGゲーム数", int(form["game"]) + settings["exclude_games"])
+
+def compile_legacy_plan(form, settings, columns) -> QueryPlan:
+    builder = PlanBuilder()
+    apply_legacy_filters(builder, form, settings, columns)
+    return builder.build()
 
 # =====================================================================
 # レガシーツールページ
@@ -346,7 +407,9 @@ def machine_page(machine_key, plan_type):
     file_key = config["file_key"]
     og_image = url_for("static", filename=config.get("og_image","ogp.jpg"), _external=True)
     link_url = config.get("link_url")
-    settings = machine_settings[display_name]
+    settings = LEGACY_SETTINGS.get(display_name)
+    if settings is None:
+        return "無効なURLです",404
     settings = apply_free_custom_label_override(settings, display_name, plan_type)
     link_preview = get_link_preview_cached(link_url) if link_url else None
     ASSET_REV = os.environ.get("ASSET_REV","20251007")
@@ -372,23 +435,9 @@ def machine_page(machine_key, plan_type):
         input_game = "0"
         selected_through = selected_at_gap = selected_prev_game = selected_prev_coin = selected_prev_diff = selected_prev_renchan = selected_prev_type = selected_custom_condition = "不問"
 
-    csv_path = f"data/{file_key}_at.csv" if selected_mode=="AT" else f"data/{file_key}_cz.csv" if selected_mode=="CZ" else f"data/{file_key}_st.csv" if selected_mode=="ST" else f"data/{file_key}_rb.csv"
+    csv_path = legacy_csv_path(file_key, selected_mode)
     try:
-        dtypes = {
-            "朝イチ": "int8",
-            "スルー回数": "int16",
-            "AT間ゲーム数": "int32",
-            "前回当選ゲーム数": "int32",
-            "前回獲得枚数": "int32",
-            "前回差枚数": "int32",
-            "前回連荘数": "int16",
-            "当該REGゲーム数": "int32",
-            "REGゲーム数": "float32",
-            "ATゲーム数": "float32",
-            "REG枚数": "float32",
-            "AT枚数": "float32",
-        }
-        df = load_csv_cached(csv_path, dtypes=dtypes)
+        dataset = load_dataset(csv_path, dtypes=LEGACY_DTYPES)
     except Exception as e:
         return render_template(template_name, error_msg=f"CSV読み込みエラー: {e}", result=None, labels=settings.get("labels",{}))
 
@@ -405,14 +454,16 @@ def machine_page(machine_key, plan_type):
         "custom_condition": selected_custom_condition
     }
 
-    filtered_df = filter_dataframe(df, form, settings)
+    # all_tool と同じ索引・集計・クエリ結果キャッシュを使う
+    plan = compile_legacy_plan(form, settings, dataset.frame.columns)
+    agg = aggregate_plan_cached(dataset, csv_path, plan)
 
-    if not filtered_df.empty and len(filtered_df) >= 100:
-        count = len(filtered_df)
-        avg_reg_games = filtered_df["REGゲーム数"].mean()
-        avg_at_games = filtered_df["ATゲーム数"].mean()
-        avg_reg_coins = filtered_df["REG枚数"].mean()
-        avg_at_coins = filtered_df["AT枚数"].mean()
+    if agg.count >= 100:
+        count = agg.count
+        avg_reg_games = agg.mean("REGゲーム数")
+        avg_at_games = agg.mean("ATゲーム数")
+        avg_reg_coins = agg.mean("REG枚数")
+        avg_at_coins = agg.mean("AT枚数")
         hatsu_atari = max(avg_reg_games - int(input_game),0)
         avg_diff = avg_at_coins + avg_reg_coins - (hatsu_atari*50/settings["coin_moti"])
         avg_in = (hatsu_atari + avg_at_games)*3
@@ -426,10 +477,8 @@ def machine_page(machine_key, plan_type):
             "機械割": f"{payout_rate:,.1f}%",
             "期待値": f"{expected_value:,.0f}円"
         }
-    elif len(filtered_df)<100:
-        result = "サンプル不足"
     else:
-        result = None
+        result = "サンプル不足"
 
     if request.method=="GET":
         result = None
@@ -514,85 +563,19 @@ def api_default_values():
 
     })
 
-# =====================================================
-# range option生成
-# =====================================================
-
-def build_range_options(setting):
-
-    # =================================================
-    # 5項目形式
-    # (normal_min, normal_max, step, final_min, final_max)
-    # =================================================
-    if len(setting) >= 5:
-
-        start = setting[0]
-        normal_max = setting[1]
-        step = setting[2]
-        final_min = setting[3]
-        final_max = setting[4]
-
-        values = list(range(start, normal_max + 1, step))
-
-        # 最小追加
-        if final_min not in values:
-            values.insert(0, final_min)
-
-        # 最大追加
-        if final_max not in values:
-            values.append(final_max)
-
-        return values
-
-    # =================================================
-    # 4項目形式
-    # (start, normal_max, step, final_max)
-    # =================================================
-    start = setting[0]
-    normal_max = setting[1]
-    step = setting[2]
-    final_value = setting[3]
-
-    values = list(range(start, normal_max + 1, step))
-
-    if final_value not in values:
-        values.append(final_value)
+def filter_dataframe_v2(df, form, settings, index=None):
 
-    return values
+    # 索引（BitmapIndex）があればビットマップのAND、なければ列を走査
+    q = index.query() if index is not None else ScanQuery(df)
 
+    apply_filters_v2(q, form, settings)
 
-# =================================================
-# 最大値取得
-# =================================================
-def get_setting_max(setting):
-
-    # 5項目
-    if len(setting) >= 5:
-        return setting[4]
-
-    # 4項目
-    if len(setting) >= 4:
-        return setting[3]
+    return df.loc[q.mask()]
 
-    # 旧形式
-    return setting[1]
-
-
-# =================================================
-# 最小値取得
-# =================================================
-def get_setting_min(setting):
-
-    # 5項目
-    if len(setting) >= 5:
-        return setting[3]
-
-    # 通常
-    return setting[0]
-
-def filter_dataframe_v2(df, form, settings):
-
-    mask = pd.Series(True, index=df.index)
+def apply_filters_v2(q, form, settings):
+    """
+    フォーム条件を q（ScanQuery / BitmapQuery / SortedQuery / PlanBuilder）に積む
+    """
 
     # =========================
     # ロックされていたUI項目
@@ -609,22 +592,22 @@ def filter_dataframe_v2(df, form, settings):
     # elif time_value == "朝イチ以外":
     #     mask &= df["朝イチ"].eq(0)
     if time_value == "朝イチ":
-        mask &= df["朝イチ"].eq(1)
+        q.eq("朝イチ", 1)
 
     elif time_value == "朝イチ以外":
-        mask &= df["朝イチ"].eq(0)
+        q.eq("朝イチ", 0)
 
     elif time_value == "駆け抜け後":
-        mask &= df["朝イチ"].eq(0)
-        mask &= df["前回連荘数"].eq(1)
+        q.eq("朝イチ", 0)
+        q.eq("前回連荘数", 1)
 
     elif time_value == "下位後":
-        mask &= df["朝イチ"].eq(0)
-        mask &= df["前回種別"].eq("下位")
+        q.eq("朝イチ", 0)
+        q.eq("前回種別", "下位")
 
     elif time_value == "上位後":
-        mask &= df["朝イチ"].eq(0)
-        mask &= df["前回種別"].eq("上位")
+        q.eq("朝イチ", 0)
+        q.eq("前回種別", "上位")
 
     # =========================
     # range共通（安全化）
@@ -636,16 +619,16 @@ def filter_dataframe_v2(df, form, settings):
             f"{key}_min" in locked_ui_fields
             or f"{key}_max" in locked_ui_fields
         ):
-            return pd.Series(True, index=df.index)
+            return
 
         val = form.get(key)
 
         if not val or len(val) != 2:
-            return pd.Series(True, index=df.index)
+            return
 
         min_v, max_v = val
 
-        return df[column].between(min_v, max_v)
+        q.between(column, min_v, max_v)
 
     # =========================
     # スルー回数（単体）
@@ -658,7 +641,7 @@ def filter_dataframe_v2(df, form, settings):
 
             try:
                 through_value = int(through_value)
-                mask &= df["スルー回数"].eq(through_value)
+                q.eq("スルー回数", through_value)
             except:
                 pass
 
@@ -691,7 +674,8 @@ def filter_dataframe_v2(df, form, settings):
                 lower = at_gap_value - game - at_gap_width
                 upper = at_gap_value - game + at_gap_width
 
-                mask &= df["AT間ゲーム数"].between(
+                q.between(
+                    "AT間ゲーム数",
                     lower,
                     upper
                 )
@@ -699,8 +683,8 @@ def filter_dataframe_v2(df, form, settings):
     # =========================
     # 数値条件
     # =========================
-    # mask &= apply_range("AT間ゲーム数", "at_gap")
-    mask &= apply_range("前回REG当選ゲーム数", "prev_rb_game")
+    # apply_range("AT間ゲーム数", "at_gap")
+    apply_range("前回REG当選ゲーム数", "prev_rb_game")
     prev_rb_coin_value = form.get("prev_rb_coin", "不問")
     prev_rb_coin_ranges = settings.get("prev_rb_coin", {})
 
@@ -709,22 +693,22 @@ def filter_dataframe_v2(df, form, settings):
 
         if rb_coin_range is not None:
             min_v, max_v = rb_coin_range
-            mask &= df["前回REG獲得枚数"].between(min_v, max_v)
-    mask &= apply_range("前回AT当選ゲーム数", "prev_at_game")
-    mask &= apply_range("前回AT獲得枚数", "prev_at_coin")
-    mask &= apply_range("前回差枚数", "prev_diff")
-    # mask &= apply_range("前回連荘数", "prev_renchan")
+            q.between("前回REG獲得枚数", min_v, max_v)
+    apply_range("前回AT当選ゲーム数", "prev_at_game")
+    apply_range("前回AT獲得枚数", "prev_at_coin")
+    apply_range("前回差枚数", "prev_diff")
+    # apply_range("前回連荘数", "prev_renchan")
 
     # =========================
     # 文字列条件（安全）
     # =========================
     # if "prev_type" not in locked_ui_fields:
     #     if form.get("prev_type") and form.get("prev_type") != "不問":
-    #         mask &= df["前回種別"].eq(form["prev_type"])
+    #         q.eq("前回種別", form["prev_type"])
 
     if "custom_condition" not in locked_ui_fields:
         if form.get("custom_condition") and form.get("custom_condition") != "不問":
-            mask &= df["機種別条件"].eq(form["custom_condition"])
+            q.eq("機種別条件", form["custom_condition"])
 
     # =========================
     # ゲーム数
@@ -738,9 +722,91 @@ def filter_dataframe_v2(df, form, settings):
 
     exclude_games = settings.get("exclude_games", 0)
 
-    mask &= df["当該REGゲーム数"].ge(game + exclude_games)
+    q.ge("当該REGゲーム数", game + exclude_games)
+
+# =================================================
+# 事前集計キューブ（件数・合計）→ 無理なら行フィルタ
+# =================================================
+def build_result_cube(df, settings):
+    return ResultCube(
+        df,
+        exclude_games=settings["exclude_games"],
+        game_options=settings["game"].options,
+        range_defaults={field: (settings[field].min, settings[field].max) for field in RANGE_FIELDS},
+    )
+
+def compile_filter_plan(form, settings) -> QueryPlan:
+    """
+    all_tool のフォーム → QueryPlan（machine_page の compile_legacy_plan と同じ形）
+    """
+    builder = PlanBuilder()
+    apply_filters_v2(builder, form, settings)
+    return builder.build()
+
+def aggregate_v2(dataset, machine_key, form, settings, plan=None) -> Aggregate:
+    cube = dataset.cube(machine_key, lambda df: build_result_cube(df, settings))
+    agg = cube.lookup(form, settings) if cube is not None else None
+    if agg is not None:
+        return agg
+    # 当該REGゲーム数順のデータをしきい値で区間に絞ってから集計
+    return (plan or compile_filter_plan(form, settings)).aggregate(dataset)
+
+# =================================================
+# クエリ結果キャッシュ（同じ条件の集計を使い回す）
+# =================================================
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "600"))
+# 指定するとSQLiteファイル経由でworker間共有（例: /tmp/slot_query_cache.db）
+QUERY_CACHE_DB = os.environ.get("QUERY_CACHE_DB", "")
+
+QUERY_CACHE = ResultCache(
+    max_entries=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL,
+    shared=SharedResultStore(QUERY_CACHE_DB) if QUERY_CACHE_DB else None,
+)
+
+def query_cache_key(csv_path, dataset, plan):
+    # 集計結果はデータと条件だけで決まる（machine_page / all_tool 共通のキー）
+    return json.dumps([csv_path, dataset.version, plan.key], ensure_ascii=False)
+
+def aggregate_plan_cached(dataset, csv_path, plan, compute=None) -> Aggregate:
+    """
+    plan の集計にクエリ結果キャッシュ（ヒット時はフィルタ・集計をしない）
+    compute を渡すとミス時にそれで集計する（all_tool のキューブ経由など）
+    """
+    key = query_cache_key(csv_path, dataset, plan)
+    cached = QUERY_CACHE.get(key)
+    if cached is not None:
+        count, sums = cached
+        return Aggregate(count, np.array(sums, dtype=np.float64))
+
+    agg = compute() if compute is not None else plan.aggregate(dataset)
+    QUERY_CACHE.put(key, [agg.count, [float(v) for v in agg.sums]])
+    return agg
+
+def aggregate_cached(dataset, csv_path, machine_key, form, settings) -> Aggregate:
+    plan = compile_filter_plan(form, settings)
+    return aggregate_plan_cached(
+        dataset, csv_path, plan,
+        compute=lambda: aggregate_v2(dataset, machine_key, form, settings, plan=plan),
+    )
 
-    return df.loc[mask]
+def sweep_v2(dataset, machine_key, form, settings, games):
+    """
+    打ち出しG数ごとの集計（games の順）を1回のマスク作成でまとめて求める
+    """
+    # AT間G数の範囲は打ち出しG数で動くので、共通マスクにできない → 1件ずつ
+    at_gap_raw = form.get("at_gap", "不問")
+    if "at_gap" not in form.get("locked_ui_fields", []) and at_gap_raw not in (None, "", "不問", "all"):
+        try:
+            int(at_gap_raw)
+            return [aggregate_v2(dataset, machine_key, dict(form, game=g), settings) for g in games]
+        except:
+            pass
+
+    plan = compile_filter_plan(dict(form, game=0), settings)
+    exclude_games = settings.get("exclude_games", 0)
+    return plan.sweep(dataset, [int(g) + exclude_games for g in games])
 
 def generate_labels_from_mode_options(mode_options):
 
@@ -844,6 +910,280 @@ def get_default_values(mode_options):
     }
 
 
+# =================================================
+# all_tool 表示用ビューモデル（機種ごと1回だけ生成）
+# =================================================
+def build_all_view(cfg):
+    """
+    machine_configs の1機種 → all_tool が毎回使う設定由来の値一式（読み取り専用）
+    settings は config.settings で正規化済み（不正な設定は SettingsError）
+    """
+    settings = normalize_settings(cfg.get("settings", {}))
+    mode_options = settings["mode_options"]
+
+    return MappingProxyType({
+        "display_name": cfg.get("display_name", ""),
+        "settings": settings,
+        "help_texts": settings["help_texts"],
+        "links": tuple(cfg.get("links") or []) + tuple(getattr(new_config, "COMMON_LINKS", []) or []),
+
+        "mode_options": mode_options,
+        "time_options": settings["time_options"],
+        "defaults": MappingProxyType(get_default_values(mode_options)),
+        "labels": MappingProxyType(generate_labels_from_mode_options(mode_options)),
+
+        "game_options": settings["game"].options,
+        "through_options": ("不問",) + settings["through"].options,
+        "at_gap_options": settings["at_gap"].options,
+        "prev_rb_game_options": settings["prev_rb_game"].options,
+        "prev_rb_coin_options": tuple(settings["prev_rb_coin"].keys()),
+        "prev_at_game_options": settings["prev_at_game"].options,
+        "prev_at_coin_options": settings["prev_at_coin"].options,
+        "prev_diff_options": settings["prev_diff"].options,
+        "custom_condition_options": settings["custom_condition_options"],
+
+        # 範囲項目の (最小, 最大) 初期値
+        "range_defaults": MappingProxyType({
+            field: (settings[field].min, settings[field].max)
+            for field in RANGE_FALLBACKS
+        }),
+    })
+
+# 機種キー → ビューモデル（初回アクセス時に機種ごとに生成、不正な設定の機種は除外）
+ALL_VIEWS = new_config.machine_configs.derive(build_all_view, reject=(SettingsError,))
+
+# 機種未選択時（設定なし・リンクなし）
+EMPTY_ALL_VIEW = MappingProxyType(dict(build_all_view({}), links=()))
+
+# 機種検索候補（全機種共通）
+ALL_DISPLAY_NAMES = tuple(
+    (k, v["display_name"], v.get("search_word", ""))
+    for k, v in new_config.machine_configs.summaries()
+)
+
+
+# =================================================
+# all_tool フォーム解析
+# =================================================
+def parse_all_form(values, view):
+    """
+    request.form → 選択値（未入力・不正値は初期値）
+    """
+    defaults = view["defaults"]
+    range_defaults = view["range_defaults"]
+
+    def get_int(name, default):
+        v = values.get(name, None)
+        if v is None or v == "":
+            return int(default)
+        try:
+            return int(v)
+        except:
+            return int(default)
+
+    def get_float(name, default):
+        try:
+            return float(values.get(name, default))
+        except:
+            return default
+
+    try:
+        game = int(values.get("game", defaults["game"]))
+    except:
+        game = defaults["game"]
+
+    through = values.get("through", "0")
+
+    if through not in ("all", "不問"):
+        try:
+            through = int(through)
+        except:
+            through = 0
+
+    return {
+        "mode": values.get("mode", defaults["mode"]),
+        "time": values.get("time", view["time_options"][0]),
+        "game": game,
+        "through": through,
+        "at_gap": values.get("at_gap", "不問"),
+        "prev_rb_game_min": get_int("prev_rb_game_min", 0),
+        "prev_rb_game_max": get_int("prev_rb_game_max", range_defaults["prev_rb_game"][1]),
+        "prev_rb_coin": values.get("prev_rb_coin", "不問"),
+        "prev_at_game_min": get_int("prev_at_game_min", 0),
+        "prev_at_game_max": get_int("prev_at_game_max", range_defaults["prev_at_game"][1]),
+        "prev_at_coin_min": get_int("prev_at_coin_min", 0),
+        "prev_at_coin_max": get_int("prev_at_coin_max", range_defaults["prev_at_coin"][1]),
+        "prev_diff_min": get_int("prev_diff_min", range_defaults["prev_diff"][0]),
+        "prev_diff_max": get_int("prev_diff_max", range_defaults["prev_diff"][1]),
+        "custom_condition": values.get("custom_condition", "不問"),
+        "locked_ui_fields": values.getlist("locked_ui_fields"),
+        "lend_medals": get_float("lend_medals", 50),
+        "exchange_medals": get_float("exchange_medals", 50),
+    }
+
+def build_filter_form(selected):
+    """
+    選択値 → filter_dataframe_v2 / apply_filters_v2 用のform
+    """
+    return {
+        "time": selected["time"],
+        "game": selected["game"],
+
+        "through": selected["through"],
+        "at_gap": selected["at_gap"],
+        "prev_rb_game": (selected["prev_rb_game_min"], selected["prev_rb_game_max"]),
+        "prev_rb_coin": selected["prev_rb_coin"],
+        "prev_at_game": (selected["prev_at_game_min"], selected["prev_at_game_max"]),
+        "prev_at_coin": (selected["prev_at_coin_min"], selected["prev_at_coin_max"]),
+        "prev_diff": (selected["prev_diff_min"], selected["prev_diff_max"]),
+        "custom_condition": selected["custom_condition"],
+        "locked_ui_fields": selected["locked_ui_fields"]
+    }
+
+# =================================================
+# 期待値計算（件数・平均 → 初当たり／機械割／期待値）
+# =================================================
+def calc_expected_value(agg, input_game, settings, lend_medals, exchange_medals):
+
+    avg_reg_games = agg.mean("REGゲーム数")
+    avg_at_games = agg.mean("ATゲーム数")
+    avg_reg_coins = agg.mean("REG枚数")
+    avg_at_coins = agg.mean("AT枚数")
+
+    hatsu_atari = max(avg_reg_games - input_game, 0)
+
+    avg_diff = (
+        (avg_at_coins + avg_reg_coins) / exchange_medals * 50
+        - (hatsu_atari * 50 / settings.get("coin_moti", 1)) / lend_medals * 50
+    )
+
+    avg_in = (hatsu_atari + avg_at_games) * 3
+    avg_out = avg_diff + avg_in
+
+    payout_rate = (avg_out / avg_in) * 100 if avg_in else 0
+    expected_value = avg_diff * 20
+
+    return {
+        "count": agg.count,
+        "hatsu_atari": hatsu_atari,
+        "avg_at_coins": avg_at_coins,
+        "payout_rate": payout_rate,
+        "expected_value": expected_value,
+    }
+
+
+# =================================================
+# 出力結果（表示用の文字列）
+# =================================================
+def build_query_result(agg, selected, settings):
+    """
+    集計 → (result, error_msg)
+    """
+    if agg.count == 0:
+        return None, "条件に一致するデータがありません"
+
+    if agg.count < 100:
+        return None, "件数が少ないため、<br>結果を出力出来ません。"
+
+    ev = calc_expected_value(
+        agg, selected["game"], settings, selected["lend_medals"], selected["exchange_medals"]
+    )
+
+    result = {
+        "件数　　　": f"{ev['count']:,}件",
+        "初当たり　": f"1/{ev['hatsu_atari']:,.1f}",
+        "獲得枚数　": f"{ev['avg_at_coins']:,.1f}枚",
+        "機械割　　": f"{ev['payout_rate']:,.1f}%",
+        "期待値　　": f"{ev['expected_value']:,.0f}円"
+    }
+    return result, None
+
+# =================================================
+# 算出条件
+# =================================================
+def build_calc_conditions(view, selected):
+
+    def with_unit(value, unit):
+        if value in ("不問", "", None):
+            return "不問"
+        return f"{value}{unit}"
+
+    def should_show_label(label):
+        return not str(label).startswith("***")
+
+    labels = view["labels"]
+    range_defaults = view["range_defaults"]
+
+    locked_ui_fields = selected["locked_ui_fields"]
+
+    calc_conditions = [
+        ("機種名", view["display_name"]),
+        ("打ち切り条件", selected["mode"]),
+        ("天井条件", selected["time"]),
+    ]
+
+    # 基本条件：ロック問わず表示
+    # ただしラベル先頭が *** の場合は非表示
+    if should_show_label(labels["through"]):
+        calc_conditions.append(
+            (labels["through"], with_unit(selected["through"], "回"))
+        )
+
+    calc_conditions.append(
+        (labels["game"], with_unit(selected["game"], "G"))
+    )
+
+    if should_show_label(labels["at_gap"]):
+        calc_conditions.append(
+            (labels["at_gap"], with_unit(selected["at_gap"], "G"))
+        )
+
+    # =========================
+    # 詳細条件：変更時のみ表示
+    # =========================
+    for field, unit in (
+        ("prev_rb_game", "G"),
+        ("prev_rb_coin", None),
+        ("prev_at_game", "G"),
+        ("prev_at_coin", "枚"),
+        ("prev_diff", "枚"),
+    ):
+        if unit is None:
+            # 前回REG獲得枚数（選択式）
+            if (
+                selected[field] not in ("不問", "", None)
+                and field not in locked_ui_fields
+            ):
+                calc_conditions.append((labels[field], selected[field]))
+            continue
+
+        min_v = selected[f"{field}_min"]
+        max_v = selected[f"{field}_max"]
+
+        changed = (min_v, max_v) != range_defaults[field]
+
+        if (
+            changed
+            and f"{field}_min" not in locked_ui_fields
+            and f"{field}_max" not in locked_ui_fields
+        ):
+            calc_conditions.append((labels[field], f"{min_v}～{max_v}{unit}"))
+
+    if (
+        selected["custom_condition"] not in ("不問", "", None)
+        and "custom_condition" not in locked_ui_fields
+    ):
+        calc_conditions.append(
+            (labels["custom_condition"], selected["custom_condition"])
+        )
+
+    calc_conditions.append(
+        ("換金ギャップ", f"{int(selected['lend_medals'])}枚貸し／{int(selected['exchange_medals'])}枚交換")
+    )
+
+    return calc_conditions
+
+
 # =========================
 # 攻略メモページ
 # =========================
@@ -876,7 +1216,7 @@ def all_tool():
     # =========================
     # 機種選択
     # =========================
-    default_machine = list(MACHINE_CONFIGS.keys())[0]
+    default_machine = next(iter(MACHINE_CONFIGS))
 
     selected_machine = (
         request.args.get("machine")
@@ -885,31 +1225,21 @@ def all_tool():
     )
 
     # =========================
-    # ★ここ修正（display_nameちゃんと入れる）
+    # 設定由来の値（起動時生成のビューモデル）
     # =========================
-    display_name = ""
-    settings = {}
-    links = []
-
-    if selected_machine in MACHINE_CONFIGS:
-        cfg = MACHINE_CONFIGS[selected_machine]
-
-        display_name = cfg.get("display_name", "")
-        settings = cfg.get("settings", {})
+    view = ALL_VIEWS.get(selected_machine, EMPTY_ALL_VIEW)
 
-        machine_links = cfg.get("links") or []
-        common_links = getattr(new_config, "COMMON_LINKS", []) or []
-
-        links = machine_links + common_links
-
-        help_texts = settings.get("help_texts", {})
+    display_name = view["display_name"]
+    settings = view["settings"]
+    help_texts = view["help_texts"]
+    labels = dict(view["labels"])
 
     # =========================
     # リンク処理
     # =========================
     link_previews = []
 
-    for item in links:
+    for item in view["links"]:
         url = item.get("link_url")
         if not url:
             continue
@@ -926,190 +1256,86 @@ def all_tool():
             link_previews.append(preview)
 
     # =========================
-    # モード関連
-    # =========================
-    mode_options = settings.get("mode_options", [])
-
-    defaults = get_default_values(mode_options)
-    labels = generate_labels_from_mode_options(mode_options)
-
-
-
-
-    # =========================
-    # モード・基本入力
-    # =========================
-    mode_options = settings.get("mode_options", [])
-
-    defaults = get_default_values(mode_options)
-
-    labels = generate_labels_from_mode_options(mode_options)
-
-    selected_mode = request.form.get("mode", defaults["mode"])
-    # selected_time = request.form.get("time", defaults["time"])
-
-
-
-
-    time_options = settings.get(
-        "time_options",
-        ["朝イチ", "朝イチ以外"]
-    )
-    selected_time = request.form.get("time", time_options[0])
-
-    try:
-        input_game = int(request.form.get("game", defaults["game"]))
-    except:
-        input_game = defaults["game"]
-
-    selected_custom_condition = request.form.get("custom_condition", "不問")
-
-
-    # =========================
-    # UIレンジ（★必ず存在させる）
+    # 入力値
     # =========================
-    through = settings.get("through", (0, 5, 1))
-    at_gap = settings.get("at_gap", (0, 1000, 50))
-    prev_rb_game = settings.get("prev_rb_game", (0, 2000, 50))
-    prev_rb_coin = settings.get("prev_rb_coin", {"不問": None})
-    prev_at_game = settings.get("prev_at_game", (0, 2000, 50))
-    prev_at_coin = settings.get("prev_at_coin", (0, 3000, 100))
-    prev_diff = settings.get("prev_diff", (-3000, 3000, 100))
+    selected = parse_all_form(request.form, view)
 
-    # =========================
-    # 打ち出しゲーム数のリスト化
-    # =========================
-    game = settings.get("game", (0, 1500, 50, 9999))
+    selected_mode = selected["mode"]
 
-    game_options = []
-
-    if len(game) >= 5:
-        game_options.append(game[4])
+    # 画面共通（選択肢・選択値）
+    page = dict(
+        selected_machine=selected_machine,
+        display_names=ALL_DISPLAY_NAMES,
 
-    game_options.extend(
-        range(
-            game[2],
-            game[1] + 1,
-            game[2]
-        )
-    )
+        time_options=view["time_options"],
 
-    game_options = sorted(set(game_options))
+        through_options=view["through_options"],
+        at_gap_options=view["at_gap_options"],
+        prev_rb_game_options=view["prev_rb_game_options"],
+        prev_rb_coin_options=view["prev_rb_coin_options"],
+        prev_at_game_options=view["prev_at_game_options"],
+        prev_at_coin_options=view["prev_at_coin_options"],
+        prev_diff_options=view["prev_diff_options"],
 
-    # =========================
-    # 最大値初期値
-    # =========================
-    through_default_max = get_setting_max(through)
-    at_gap_default_max = get_setting_max(at_gap)
-    prev_rb_game_default_max = get_setting_max(prev_rb_game)
-    prev_at_game_default_max = get_setting_max(prev_at_game)
-    prev_at_coin_default_max = get_setting_max(prev_at_coin)
-    prev_diff_default_max = get_setting_max(prev_diff)
-
-    # =========================
-    # min/max（安全変換）
-    # =========================
-    def get_int(name, default):
-        v = request.form.get(name, None)
-        if v is None or v == "":
-            return int(default)
-        try:
-            return int(v)
-        except:
-            return int(default)
+        selected_through=selected["through"],
 
-    selected_through = request.form.get("through", "0")
+        selected_at_gap=selected["at_gap"],
 
-    if selected_through not in ("all", "不問"):
-        try:
-            selected_through = int(selected_through)
-        except:
-            selected_through = 0
+        selected_prev_rb_game_min=selected["prev_rb_game_min"],
+        selected_prev_rb_game_max=selected["prev_rb_game_max"],
 
-    locked_ui_fields = request.form.getlist("locked_ui_fields")
+        selected_prev_rb_coin=selected["prev_rb_coin"],
 
-    selected_at_gap = request.form.get("at_gap", "不問")
+        selected_prev_at_game_min=selected["prev_at_game_min"],
+        selected_prev_at_game_max=selected["prev_at_game_max"],
 
-    selected_prev_rb_game_min = get_int("prev_rb_game_min", 0)
-    selected_prev_rb_game_max = get_int("prev_rb_game_max", prev_rb_game_default_max)
-    selected_prev_at_game_min = get_int("prev_at_game_min", 0)
-    selected_prev_at_game_max = get_int("prev_at_game_max", prev_at_game_default_max)
+        selected_prev_at_coin_min=selected["prev_at_coin_min"],
+        selected_prev_at_coin_max=selected["prev_at_coin_max"],
 
-    selected_prev_rb_coin = request.form.get("prev_rb_coin", "不問")
-    selected_prev_at_coin_min = get_int("prev_at_coin_min", 0)
-    selected_prev_at_coin_max = get_int("prev_at_coin_max", prev_at_coin_default_max)
+        selected_prev_diff_min=selected["prev_diff_min"],
+        selected_prev_diff_max=selected["prev_diff_max"],
 
-    selected_prev_diff_min = get_int(
-        "prev_diff_min",
-        get_setting_min(prev_diff)
-    )
+        labels=labels,
 
-    selected_prev_diff_max = get_int(
-        "prev_diff_max",
-        get_setting_max(prev_diff)
+        machines=MACHINE_CONFIGS,
+        machine_configs_url=machine_configs_url(),
+        link_previews=link_previews,
+        help_texts=help_texts,
     )
 
     # =========================
     # CSV（未選択でも落ちない）
     # =========================
-    if not selected_machine or selected_machine not in MACHINE_CONFIGS:
+    # 設定が不正で ALL_VIEWS から外された機種も未知の機種と同じ扱い（/api/* の 400 と揃える）
+    if not selected_machine or selected_machine not in MACHINE_CONFIGS or selected_machine not in ALL_VIEWS:
+        if selected_machine in MACHINE_CONFIGS:
+            error_msg = "機種の設定に誤りがあるため表示できません"
+        else:
+            error_msg = "機種が未選択です"
         return render_template(
             "index_all.html",
             machine_name=display_name or "",
-            selected_machine=None,
-            display_names=[
-                (
-                    k,
-                    v["display_name"],
-                    v.get("search_word", "")
-                )
-                for k, v in MACHINE_CONFIGS.items()
-            ],
             mode_options=[],
             selected_mode="",
             selected_time="朝イチ",
-            time_options=time_options,
             input_game=0,
 
-            through_options=["不問"] + build_range_options(through),
-            at_gap_options=build_range_options(at_gap),
-            prev_rb_game_options=build_range_options(prev_rb_game),
-            prev_rb_coin_options=list(prev_rb_coin.keys()),
-            prev_at_game_options=build_range_options(prev_at_game),
-            prev_at_coin_options=build_range_options(prev_at_coin),
-            prev_diff_options=build_range_options(prev_diff),
-
-            selected_through=selected_through,
-
-            selected_at_gap=selected_at_gap,
-
-            selected_prev_rb_game_min=selected_prev_rb_game_min,
-            selected_prev_rb_game_max=selected_prev_rb_game_max,
-            selected_prev_at_game_min=selected_prev_at_game_min,
-            selected_prev_at_game_max=selected_prev_at_game_max,
-
-            selected_prev_rb_coin=selected_prev_rb_coin,
-            selected_prev_at_coin_min=selected_prev_at_coin_min,
-            selected_prev_at_coin_max=selected_prev_at_coin_max,
-
-            selected_prev_diff_min=selected_prev_diff_min,
-            selected_prev_diff_max=selected_prev_diff_max,
-
             selected_custom_condition="不問",
 
             custom_condition_options=[],
 
-            labels=labels,
             result=None,
-            error_msg="機種が未選択です",
+            error_msg=error_msg,
 
-            machines=MACHINE_CONFIGS,
-            machine_configs=MACHINE_CONFIGS,
-            link_previews=link_previews,
-            help_texts=help_texts,
-            calc_conditions=calc_conditions
+            calc_conditions=[],
+            **dict(page, selected_machine=None)
         )
 
+    # =========================
+    # 算出条件（CSV読み込みエラーの表示でも使う）
+    # =========================
+    calc_conditions = build_calc_conditions(view, selected)
+
     # =========================
     # CSV読み込み
     # =========================
@@ -1118,349 +1344,182 @@ def all_tool():
     csv_path = f"data/{file_key}/{csv_suffix}.csv"
 
     try:
-        dtypes = {
-            "朝イチ": "int8",
-            "スルー回数": "int16",
-            "AT間ゲーム数": "int32",
-            "前回AT当選ゲーム数": "int32",
-            "前回AT獲得枚数": "int32",
-            "前回REG当選ゲーム数": "int32",
-            "前回REG獲得枚数": "int32",
-            "前回差枚数": "int32",
-            "前回連荘数": "int16",
-            "当該REGゲーム数": "int32",
-            "REGゲーム数": "float32",
-            "ATゲーム数": "float32",
-            "REG枚数": "float32",
-            "AT枚数": "float32",
-        }
-
-        df = load_csv_cached(csv_path, dtypes=dtypes)
+        dataset = load_dataset(csv_path, dtypes=ALL_DTYPES)
 
     except Exception as e:
         return render_template(
             "index_all.html",
             machine_name=display_name,
-            selected_machine=selected_machine,
-            display_names=[
-                (
-                    k,
-                    v["display_name"],
-                    v.get("search_word", "")
-                )
-                for k, v in MACHINE_CONFIGS.items()
-            ],
-            mode_options=mode_options,
-            time_options=time_options,
-            game_options=game_options,
-
-            through_options=["不問"] + build_range_options(through),
-            at_gap_options=build_range_options(at_gap),
-            prev_rb_game_options=build_range_options(prev_rb_game),
-            prev_rb_coin_options=list(prev_rb_coin.keys()),
-            prev_at_game_options=build_range_options(prev_at_game),
-            prev_at_coin_options=build_range_options(prev_at_coin),
-            prev_diff_options=build_range_options(prev_diff),
+            mode_options=view["mode_options"],
+            game_options=view["game_options"],
 
             selected_mode=selected_mode,
-            selected_through=selected_through,
-
-            selected_at_gap=selected_at_gap,
-
-            selected_prev_rb_game_min=selected_prev_rb_game_min,
-            selected_prev_rb_game_max=selected_prev_rb_game_max,
-            selected_prev_at_game_min=selected_prev_at_game_min,
-            selected_prev_at_game_max=selected_prev_at_game_max,
-
-            selected_prev_rb_coin=selected_prev_rb_coin,
-            selected_prev_at_coin_min=selected_prev_at_coin_min,
-            selected_prev_at_coin_max=selected_prev_at_coin_max,
 
-            selected_prev_diff_min=selected_prev_diff_min,
-            selected_prev_diff_max=selected_prev_diff_max,
+            selected_custom_condition=selected["custom_condition"],
 
-            selected_custom_condition=selected_custom_condition,
+            custom_condition_options=view["custom_condition_options"],
 
-            custom_condition_options=settings.get("custom_condition_options", []),
-
-            labels=labels,
             result=None,
             error_msg=f"CSV読み込みエラー: {e}",
 
-            machines=MACHINE_CONFIGS,
-            machine_configs=MACHINE_CONFIGS,
-            link_previews=link_previews,
-            help_texts=help_texts,
-            calc_conditions=calc_conditions
+            calc_conditions=calc_conditions,
+            **page
         )
 
-    
-    # =========================
-    # form
-    # =========================
-    form = {
-        "time": selected_time,
-        "game": input_game,
-
-        "through": selected_through,
-        "at_gap": selected_at_gap,
-        "prev_rb_game": (selected_prev_rb_game_min, selected_prev_rb_game_max),
-        "prev_rb_coin": selected_prev_rb_coin,
-        "prev_at_game": (selected_prev_at_game_min, selected_prev_at_game_max),
-        "prev_at_coin": (selected_prev_at_coin_min, selected_prev_at_coin_max),
-        "prev_diff": (selected_prev_diff_min, selected_prev_diff_max),
-        "custom_condition": selected_custom_condition,
-        "locked_ui_fields": locked_ui_fields
-    }
-
     # =========================
-    # フィルタ
+    # フィルタ・集計
     # =========================
-    filtered_df = filter_dataframe_v2(df, form, settings)
+    agg = aggregate_cached(dataset, csv_path, selected_machine, build_filter_form(selected), settings)
 
     # =========================
     # 計算
     # =========================
-    # =========================
-    # 計算
-    # =========================
-    try:
-        lend_medals = float(request.form.get("lend_medals", 50))
-    except:
-        lend_medals = 50
-
-    try:
-        exchange_medals = float(request.form.get("exchange_medals", 50))
-    except:
-        exchange_medals = 50
-
     result = None
     error_msg = None
 
     if request.method == "POST":
+        result, error_msg = build_query_result(agg, selected, settings)
 
-        if filtered_df.empty:
-
-            error_msg = "条件に一致するデータがありません"
-
-        elif len(filtered_df) < 100:
-
-            error_msg = "件数が少ないため、<br>結果を出力出来ません。"
-
-        else:
-
-            count = len(filtered_df)
-
-            avg_reg_games = filtered_df["REGゲーム数"].mean()
-            avg_at_games = filtered_df["ATゲーム数"].mean()
-            avg_reg_coins = filtered_df["REG枚数"].mean()
-            avg_at_coins = filtered_df["AT枚数"].mean()
-
-            # hatsu_atari = max(avg_reg_games - input_game, 0)
-
-            # avg_diff = avg_at_coins + avg_reg_coins - (
-            #     hatsu_atari * 50 / settings.get("coin_moti", 1)
-            # )
-            # avg_in = (hatsu_atari + avg_at_games) * 3
-
-
-            hatsu_atari = max(avg_reg_games - input_game, 0)
-
-            avg_diff = (
-                (avg_at_coins + avg_reg_coins) / exchange_medals * 50
-                - (hatsu_atari * 50 / settings.get("coin_moti", 1)) / lend_medals * 50
-            )
+    # =========================
+    # render（★全変数必ず存在）
+    # =========================
+    return render_template(
+        "index_all.html",
 
-            avg_in = (hatsu_atari + avg_at_games) * 3
-            avg_out = avg_diff + avg_in
+        machine_name=display_name,
 
-            payout_rate = (avg_out / avg_in) * 100 if avg_in else 0
-            expected_value = avg_diff * 20
+        mode_options=view["mode_options"],
+        selected_mode=selected_mode,
+        selected_time=selected["time"],
+        input_game=selected["game"],
+        game_options=view["game_options"],
 
-            result = {
-                "件数　　　": f"{count:,}件",
-                "初当たり　": f"1/{hatsu_atari:,.1f}",
-                "獲得枚数　": f"{avg_at_coins:,.1f}枚",
-                "機械割　　": f"{payout_rate:,.1f}%",
-                "期待値　　": f"{expected_value:,.0f}円"
-            }
+        selected_custom_condition=selected["custom_condition"],
 
-    # =========================
-    # 算出条件
-    # =========================
-    def with_unit(value, unit):
-        if value in ("不問", "", None):
-            return "不問"
-        return f"{value}{unit}"
+        custom_condition_options=view["custom_condition_options"],
 
-    def should_show_label(label):
-        return not str(label).startswith("***")
+        result=result,
+        error_msg=error_msg,
 
-    calc_conditions = [
-        ("機種名", display_name),
-        ("打ち切り条件", selected_mode),
-        ("天井条件", selected_time),
-    ]
+        calc_conditions=calc_conditions,
+        **page
+    )
 
-    # 基本条件：ロック問わず表示
-    # ただしラベル先頭が *** の場合は非表示
-    if should_show_label(labels["through"]):
-        calc_conditions.append(
-            (labels["through"], with_unit(selected_through, "回"))
-        )
+# =====================================================================
+# 打ち出しG数スイープ（all_toolと同じフォーム → 全game_optionsの結果をJSON）
+# =====================================================================
+@app.route("/api/sweep", methods=["POST"])
+def api_sweep():
 
-    calc_conditions.append(
-        (labels["game"], with_unit(input_game, "G"))
-    )
+    if not is_all_authorized():
+        return jsonify({"error": "unauthorized"}), 401
 
-    if should_show_label(labels["at_gap"]):
-        calc_conditions.append(
-            (labels["at_gap"], with_unit(selected_at_gap, "G"))
-        )
+    MACHINE_CONFIGS = new_config.machine_configs
 
-    # =========================
-    # 詳細条件：変更時のみ表示
-    # =========================
-    prev_rb_game_changed = (
-        selected_prev_rb_game_min != get_setting_min(prev_rb_game)
-        or selected_prev_rb_game_max != get_setting_max(prev_rb_game)
-    )
+    selected_machine = request.args.get("machine") or request.form.get("machine")
+    cfg = MACHINE_CONFIGS.get(selected_machine)
+    view = ALL_VIEWS.get(selected_machine)
 
-    prev_at_game_changed = (
-        selected_prev_at_game_min != get_setting_min(prev_at_game)
-        or selected_prev_at_game_max != get_setting_max(prev_at_game)
-    )
+    if not cfg or view is None:
+        return jsonify({"error": "invalid machine"}), 400
 
-    prev_at_coin_changed = (
-        selected_prev_at_coin_min != get_setting_min(prev_at_coin)
-        or selected_prev_at_coin_max != get_setting_max(prev_at_coin)
-    )
+    settings = view["settings"]
+    selected = parse_all_form(request.form, view)
 
-    prev_diff_changed = (
-        selected_prev_diff_min != get_setting_min(prev_diff)
-        or selected_prev_diff_max != get_setting_max(prev_diff)
-    )
+    csv_suffix = mode_to_csv_suffix(selected["mode"]) or "rb"
+    csv_path = f"data/{cfg['file_key']}/{csv_suffix}.csv"
 
-    if (
-        prev_rb_game_changed
-        and "prev_rb_game_min" not in locked_ui_fields
-        and "prev_rb_game_max" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["prev_rb_game"], f"{selected_prev_rb_game_min}～{selected_prev_rb_game_max}G")
-        )
+    try:
+        dataset = load_dataset(csv_path, dtypes=ALL_DTYPES)
+    except Exception:
+        return jsonify({"error": "データが見つかりません"}), 404
 
-    if (
-        selected_prev_rb_coin not in ("不問", "", None)
-        and "prev_rb_coin" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["prev_rb_coin"], selected_prev_rb_coin)
-        )
+    game_options = view["game_options"]
+    aggs = sweep_v2(dataset, selected_machine, build_filter_form(selected), settings, game_options)
 
-    if (
-        prev_at_game_changed
-        and "prev_at_game_min" not in locked_ui_fields
-        and "prev_at_game_max" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["prev_at_game"], f"{selected_prev_at_game_min}～{selected_prev_at_game_max}G")
-        )
+    rows = []
+    for game, agg in zip(game_options, aggs):
+        row = {"game": game, "count": agg.count}
 
-    if (
-        prev_at_coin_changed
-        and "prev_at_coin_min" not in locked_ui_fields
-        and "prev_at_coin_max" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["prev_at_coin"], f"{selected_prev_at_coin_min}～{selected_prev_at_coin_max}枚")
-        )
+        if agg.count < 100:
+            row.update({"初当たり": None, "機械割": None, "期待値": None})
+        else:
+            ev = calc_expected_value(
+                agg, game, settings, selected["lend_medals"], selected["exchange_medals"]
+            )
+            row.update({
+                "初当たり": round(ev["hatsu_atari"], 1),
+                "機械割": round(ev["payout_rate"], 1),
+                "期待値": round(ev["expected_value"]),
+            })
 
-    if (
-        prev_diff_changed
-        and "prev_diff_min" not in locked_ui_fields
-        and "prev_diff_max" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["prev_diff"], f"{selected_prev_diff_min}～{selected_prev_diff_max}枚")
-        )
+        rows.append(row)
 
-    if (
-        selected_custom_condition not in ("不問", "", None)
-        and "custom_condition" not in locked_ui_fields
-    ):
-        calc_conditions.append(
-            (labels["custom_condition"], selected_custom_condition)
-        )
+    return jsonify({
+        "machine": selected_machine,
+        "mode": selected["mode"],
+        "results": rows,
+    })
 
-    calc_conditions.append(
-        ("換金ギャップ", f"{int(lend_medals)}枚貸し／{int(exchange_medals)}枚交換")
-    )
 
-    # =========================
-    # render（★全変数必ず存在）
-    # =========================
-    return render_template(
-        "index_all.html",
+# =====================================================================
+# 単発クエリ（all_toolと同じフォーム → 出力結果・算出条件だけJSON）
+# =====================================================================
+@app.route("/api/query", methods=["POST"])
+def api_query():
 
-        machine_name=display_name,
-        selected_machine=selected_machine,
-        display_names=[
-            (
-                k,
-                v["display_name"],
-                v.get("search_word", "")
-            )
-            for k, v in MACHINE_CONFIGS.items()
-        ],
+    if not is_all_authorized():
+        return jsonify({"error": "unauthorized"}), 401
 
-        mode_options=mode_options,
-        selected_mode=selected_mode,
-        selected_time=selected_time,
-        time_options=time_options,
-        input_game=input_game,
-        game_options=game_options,
+    MACHINE_CONFIGS = new_config.machine_configs
 
-        through_options=["不問"] + build_range_options(through),
-        at_gap_options=build_range_options(at_gap),
-        prev_rb_game_options=build_range_options(prev_rb_game),
-        prev_rb_coin_options=list(prev_rb_coin.keys()),
-        prev_at_game_options=build_range_options(prev_at_game),
-        prev_at_coin_options=build_range_options(prev_at_coin),
-        prev_diff_options=build_range_options(prev_diff),
+    selected_machine = request.args.get("machine") or request.form.get("machine")
+    cfg = MACHINE_CONFIGS.get(selected_machine)
+    view = ALL_VIEWS.get(selected_machine)
 
-        selected_through=selected_through,
+    if not cfg or view is None:
+        return jsonify({"error": "invalid machine"}), 400
 
-        selected_at_gap=selected_at_gap,
+    settings = view["settings"]
+    selected = parse_all_form(request.form, view)
 
-        selected_prev_rb_game_min=selected_prev_rb_game_min,
-        selected_prev_rb_game_max=selected_prev_rb_game_max,
+    csv_suffix = mode_to_csv_suffix(selected["mode"]) or "rb"
+    csv_path = f"data/{cfg['file_key']}/{csv_suffix}.csv"
 
-        selected_prev_rb_coin=selected_prev_rb_coin,
+    try:
+        dataset = load_dataset(csv_path, dtypes=ALL_DTYPES)
+    except Exception:
+        return jsonify({"error": "データが見つかりません"}), 404
 
-        selected_prev_at_game_min=selected_prev_at_game_min,
-        selected_prev_at_game_max=selected_prev_at_game_max,
+    agg = aggregate_cached(dataset, csv_path, selected_machine, build_filter_form(selected), settings)
+    result, error_msg = build_query_result(agg, selected, settings)
 
-        selected_prev_at_coin_min=selected_prev_at_coin_min,
-        selected_prev_at_coin_max=selected_prev_at_coin_max,
+    return jsonify({
+        "result": result,
+        "error_msg": error_msg,
+        "calc_conditions": build_calc_conditions(view, selected),
+    })
 
-        selected_prev_diff_min=selected_prev_diff_min,
-        selected_prev_diff_max=selected_prev_diff_max,
 
-        selected_custom_condition=selected_custom_condition,
+# =====================================================================
+# キャッシュ状況（ヒット率など）
+# =====================================================================
+@app.route("/api/cache_stats")
+def api_cache_stats():
 
-        custom_condition_options=settings.get("custom_condition_options", []),
+    if not is_all_authorized():
+        return jsonify({"error": "unauthorized"}), 401
 
-        labels=labels,
-        result=result,
-        error_msg=error_msg,
+    return jsonify({
+        "data": DATA_CACHE.stats(),
+        "datasets": DATASETS.stats(),
+        "query": QUERY_CACHE.stats(),
+        "preview": PREVIEW_CACHE.stats(),
+        "verify": VERIFY_POOL.stats(),
+        "config": config_stats(),
+        "warm_up": WARM_UP_STATE,
+    })
 
-        machines=MACHINE_CONFIGS,
-        machine_configs=MACHINE_CONFIGS,
-        link_previews=link_previews,
-        help_texts=help_texts,
-        calc_conditions=calc_conditions
-    )
 
 # ================================
 # 🔹 東リベツール（/toreve/tools）
@@ -1515,10 +1574,167 @@ def kabaneriunato_tools():
 def tool_list():
     return render_template("tool_list.html")
 
+# ==============================================================================
+# machine_configs のJS配信（初回アクセス時に1回だけ生成・内容ハッシュ付きURL）
+# ==============================================================================
+def build_machine_configs_asset():
+    """
+    new_config.machine_configs → (本文bytes, ハッシュ)
+    """
+    # 展開済みの表には入れずに読む（起動時に全機種を展開しない）
+    table = new_config.machine_configs
+    configs = {key: table.peek(key) for key in table}
+    body = f"window.machineConfigs = {app.json.dumps(configs)};\n".encode("utf-8")
+    return body, hashlib.sha256(body).hexdigest()[:16]
+
+_machine_configs_asset = None
+
+def machine_configs_asset_cached():
+    global _machine_configs_asset
+    if _machine_configs_asset is None:
+        _machine_configs_asset = build_machine_configs_asset()
+    return _machine_configs_asset
+
+def machine_configs_url():
+    return url_for("machine_configs_asset", digest=machine_configs_asset_cached()[1])
+
+@app.route("/all/machine_configs.<digest>.js")
+def machine_configs_asset(digest):
+
+    if not is_all_authorized():
+        abort(401)
+
+    body, body_hash = machine_configs_asset_cached()
+
+    # 古いハッシュは最新へ（デプロイ直後の古いHTML対策）
+    if digest != body_hash:
+        return redirect(machine_configs_url())
+
+    response = app.response_class(body, mimetype="text/javascript")
+    response.set_etag(body_hash)
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+# ==============================================================================
+# 起動時ウォームアップ（gunicorn.conf.py の when_ready から fork 前に呼ぶ）
+# ==============================================================================
+# "all" か機種キーのカンマ区切り（空なら何もしない）
+WARM_UP_MACHINES = os.environ.get("WARM_UP_MACHINES", "all")
+
+WARM_UP_STATE = {"ready": False, "seconds": None, "machines": []}
+
+def _warm_targets():
+    """
+    (ツール, 機種キー, {CSVパス: (dtypes, キューブ生成 or None)}) を順に返す
+
+    設定は peek() で読み、正規化もその場限り（ALL_VIEWS / LEGACY_SETTINGS には入れない）。
+    機種ごとの遅延展開は初回リクエスト時のまま
+    """
+    wanted = None if WARM_UP_MACHINES == "all" else set(filter(None, WARM_UP_MACHINES.split(",")))
+
+    table = new_config.machine_configs
+    for machine_key in table:
+        if wanted is not None and machine_key not in wanted:
+            continue
+        cfg = table.peek(machine_key)
+        try:
+            settings = normalize_settings(cfg.get("settings", {}))
+        except SettingsError:
+            continue
+        build_cube = lambda df, settings=settings: build_result_cube(df, settings)
+        yield "all", machine_key, {
+            f"data/{cfg['file_key']}/{mode_to_csv_suffix(mode)}.csv": (ALL_DTYPES, build_cube)
+            for mode in settings["mode_options"]
+        }
+
+    for machine_key, cfg in machine_configs.items():
+        if cfg["display_name"] not in machine_settings or (wanted is not None and machine_key not in wanted):
+            continue
+        try:
+            settings = normalize_legacy_settings(machine_settings.peek(cfg["display_name"]))
+        except SettingsError:
+            continue
+        yield "legacy", machine_key, {
+            legacy_csv_path(cfg["file_key"], mode): (LEGACY_DTYPES, None)
+            for mode in settings["mode_options"]
+        }
+
+def warm_up() -> dict:
+    """
+    機種のデータ読み込み・索引・キューブを作っておく（機種設定は展開しない）。
+    DATA_CACHE の上限（DATA_CACHE_MAX_MB）は守り、追い出しが始まったら残りは
+    読み込まない（初回リクエスト時に読む）。常駐させたい機種は DATA_CACHE_PINNED で指定。
+    終わったら WARM_UP_STATE["ready"] を立てる（/healthz/ready が200になる）。
+    """
+    started = time.perf_counter()
+    machines = []
+    evictions = DATA_CACHE.evictions
+
+    for tool, machine_key, files in _warm_targets():
+        machine_started = time.perf_counter()
+        entry = {"tool": tool, "machine": machine_key, "files": 0, "rows": 0, "skipped": 0, "errors": []}
+        for csv_path, (dtypes, build_cube) in files.items():
+            if not os.path.exists(csv_path) and not os.path.isdir(bundle_path(csv_path)):
+                continue
+            if DATA_CACHE.evictions > evictions:
+                entry["skipped"] += 1
+                continue
+            try:
+                dataset = load_dataset(csv_path, dtypes=dtypes)
+                if build_cube is not None:
+                    dataset.cube(machine_key, build_cube)
+            except Exception as e:
+                entry["errors"].append(f"{csv_path}: {e}")
+                continue
+            entry["files"] += 1
+            entry["rows"] += len(dataset.frame)
+        entry["seconds"] = round(time.perf_counter() - machine_started, 3)
+        machines.append(entry)
+
+    machine_configs_asset_cached()
+
+    WARM_UP_STATE.update(
+        ready=True,
+        seconds=round(time.perf_counter() - started, 3),
+        machines=machines,
+    )
+    return WARM_UP_STATE
+
+@app.route("/healthz/ready")
+def healthz_ready():
+    status = 200 if WARM_UP_STATE["ready"] else 503
+    return jsonify({"ready": WARM_UP_STATE["ready"], "seconds": WARM_UP_STATE["seconds"]}), status
+
+# ==============================================================================
+# 人気機種のデータ常駐（DATA_CACHE_PINNED=bigdream,tekken6 のように指定）
+# ==============================================================================
+for _machine_key in filter(None, os.environ.get("DATA_CACHE_PINNED", "").split(",")):
+    pin_machine_datasets(_machine_key.strip())
+
+# ==============================================================================
+# リンクプレビューの事前取得（ストアに無い・期限切れのものだけ裏で取得）
+# ==============================================================================
+# 取得スレッドは fork で引き継がれないので、import 時ではなく worker 起動後に呼ぶ
+# （gunicorn.conf.py の post_worker_init）。ビルド時の python -m preview.prewarm で大半は取得済み
+PREVIEW_PREWARM = os.environ.get("PREVIEW_PREWARM", "1") == "1"
+
+def warm_previews() -> int:
+    if not PREVIEW_PREWARM:
+        return 0
+    return PREVIEW_CACHE.warm(collect_urls(new_config))
+
 # ==============================================================================
 # アプリ起動
 # ==============================================================================
 if __name__ == "__main__":
+    # 本番は gunicorn（gunicorn.conf.py）。ここはローカル検証用
+    # reloader の子プロセスだけ裏でウォームアップ（/healthz/ready は完了後に200）
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" and WARM_UP_MACHINES:
+        threading.Thread(target=warm_up, daemon=True).start()
+        DATASETS.start()
+        warm_previews()
     # ローカル検証時のみ debug=True にしてOK。公開時は False 推奨。
     # app.run(debug=False)
     app.run(debug=True, use_reloader=True)
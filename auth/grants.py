@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterable, Mapping, Tuple, Union
+
+# セッションに入れる形: "<索引の版>.<ビット列の16進>"
+Grants = Union[str, Mapping[str, bool], None]
+
+
+def _digest(keys: Tuple[str, ...]) -> str:
+    return hashlib.sha256("\n".join(keys).encode("utf-8")).hexdigest()[:8]
+
+
+# =========================================================
+# ツール利用権（machine:plan）のビットセット
+# =========================================================
+class GrantIndex:
+    """
+    "machine:plan" → ビット位置。
+
+    索引の版（キー一覧のハッシュ）もセッションに入れておく。
+    発行時のキー一覧が今の一覧の先頭部分と一致すれば（末尾に機種を追加しただけなら）
+    その範囲のビットだけ有効とし、並べ替え・途中への挿入・削除で版が合わなくなったら
+    無効として扱う（別機種のビットを誤って許可しないため）。
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = tuple(dict.fromkeys(keys))
+        self.bits: Dict[str, int] = {key: 1 << i for i, key in enumerate(self.keys)}
+        # 先頭 n 件のハッシュ → n（末尾への追加前に発行された版も引ける）
+        self._prefixes: Dict[str, int] = {}
+        for n in range(len(self.keys), -1, -1):
+            self._prefixes.setdefault(_digest(self.keys[:n]), n)
+        self.version = _digest(self.keys)
+
+    def decode(self, value: Grants) -> int:
+        if isinstance(value, str):
+            version, _, mask = value.partition(".")
+            n = self._prefixes.get(version)
+            if n is None:
+                return 0
+            try:
+                return int(mask, 16) & ((1 << n) - 1)
+            except ValueError:
+                return 0
+        if isinstance(value, Mapping):
+            # 旧形式 {"machine:plan": True}
+            mask = 0
+            for key, allowed in value.items():
+                if allowed:
+                    mask |= self.bits.get(key, 0)
+            return mask
+        return 0
+
+    def encode(self, mask: int) -> str:
+        return f"{self.version}.{mask:x}"
+
+    def has(self, value: Grants, key: str) -> bool:
+        bit = self.bits.get(key)
+        return bit is not None and bool(self.decode(value) & bit)
+
+    def grant(self, value: Grants, key: str) -> str:
+        return self.encode(self.decode(value) | self.bits.get(key, 0))
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# (残りトークン, 最終更新UNIX時刻)
+Bucket = Tuple[float, float]
+
+
+def _refill(bucket: Optional[Bucket], capacity: float, rate: float, now: float) -> float:
+    if bucket is None:
+        return capacity
+    tokens, updated = bucket
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+# =========================================================
+# バケット保存先（プロセス内 / SQLite）
+# =========================================================
+class MemoryBackend:
+    """
+    プロセス内のdict（workerごと）。満タンに戻ったバケットは時々捨てる
+    """
+
+    PRUNE_AT = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Bucket] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        with self._lock:
+            tokens = _refill(self._buckets.get(key), capacity, rate, now) - 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.PRUNE_AT:
+                self._prune(capacity, rate, now)
+            return tokens
+
+    def peek(self, key: str, capacity: float, rate: float, now: float) -> float:
+        with self._lock:
+            return _refill(self._buckets.get(key), capacity, rate, now)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _prune(self, capacity: float, rate: float, now: float) -> None:
+        for key in [k for k, b in self._buckets.items() if _refill(b, capacity, rate, now) >= capacity]:
+            del self._buckets[key]
+
+
+class SQLiteBackend:
+    """
+    SQLiteファイル（全workerで共有・再起動後も保持）。
+    take() の PRUNE_EVERY 回ごとに満タンに戻った行を消す
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._takes = 0
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # ファイル・表は最初に使うときに作る（import 時に開けなくても起動は止めない）
+        conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+        if not self._ready:
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+                )
+            except Exception:
+                conn.close()
+                raise
+            self._ready = True
+        return conn
+
+    def _get(self, conn: sqlite3.Connection, key: str) -> Optional[Bucket]:
+        return conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> float:
+        conn = self._connect()
+        try:
+            # 読んでから書くまでを他workerと排他
+            conn.execute("BEGIN IMMEDIATE")
+            tokens = _refill(self._get(conn, key), capacity, rate, now) - 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+            with self._lock:
+                self._takes += 1
+                prune = self._takes % self.PRUNE_EVERY == 0
+            if prune:
+                self._prune(conn, capacity, rate, now)
+            return tokens
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection, capacity: float, rate: float, now: float) -> None:
+        conn.execute(
+            "DELETE FROM buckets WHERE tokens + (? - updated) * ? >= ?",
+            (now, rate, capacity),
+        )
+
+    def peek(self, key: str, capacity: float, rate: float, now: float) -> float:
+        conn = self._connect()
+        try:
+            return _refill(self._get(conn, key), capacity, rate, now)
+        finally:
+            conn.close()
+
+    def reset(self, key: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM buckets WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+
+# =========================================================
+# トークンバケット式のログイン試行制限
+# =========================================================
+class RateLimiter:
+    """
+    失敗1回でトークンを1つ使い、refill_seconds で capacity 個まで戻る。
+    トークンが1未満の間はロック（戻るまでの時刻を返す）。
+    """
+
+    def __init__(self, backend, capacity: int, refill_seconds: float, clock=time.time):
+        self.backend = backend
+        self.capacity = float(capacity)
+        self.rate = capacity / refill_seconds
+        self.clock = clock
+
+    def locked_until(self, key: str) -> Optional[float]:
+        now = self.clock()
+        tokens = self.backend.peek(key, self.capacity, self.rate, now)
+        if tokens >= 1:
+            return None
+        return now + (1 - tokens) / self.rate
+
+    def fail(self, key: str) -> None:
+        self.backend.take(key, self.capacity, self.rate, self.clock())
+
+    def reset(self, key: str) -> None:
+        self.backend.reset(key)
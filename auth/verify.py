@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, Optional
+
+from werkzeug.security import check_password_hash
+
+
+class VerifyBusy(Exception):
+    """
+    検証待ちが上限を超えた / 待ち時間切れ
+    """
+
+
+# =========================================================
+# パスワード検証プール（scrypt を同時実行数つきで実行）
+# =========================================================
+class VerifyPool:
+    """
+    check_password_hash（scrypt:32768:8:1 で数十ms・32MB）を専用スレッドで実行する。
+
+    - 同時に計算するのは max_workers 件まで（残りは待ち行列）
+    - 待ち行列が max_queue を超えたら VerifyBusy（検索リクエストを巻き込まない）
+    - 一致した (ハッシュ, 入力) は HMAC をキーに覚えておき、次回は計算しない
+      （不一致は覚えない。総当たりはレートリミット側で止める）
+    """
+
+    def __init__(
+        self,
+        secret: bytes,
+        max_workers: int = 2,
+        max_queue: int = 16,
+        timeout: float = 5.0,
+        cache_size: int = 1024,
+        check: Callable[[str, str], bool] = check_password_hash,
+    ):
+        self.secret = secret
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.check = check
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+        self._verified: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # gunicorn の preload で fork された場合は作り直す
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="verify"
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _cache_key(self, pw_hash: str, password: str) -> bytes:
+        return hmac.new(self.secret, f"{pw_hash}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def verify(self, pw_hash: str, password: str) -> bool:
+        key = self._cache_key(pw_hash, password)
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                self.cache_hits += 1
+                return True
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise VerifyBusy()
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+
+        submitted = time.perf_counter()
+        future = self._pool().submit(self._run, pw_hash, password, submitted)
+        try:
+            ok = future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self.rejected += 1
+            raise VerifyBusy()
+
+        if ok:
+            with self._lock:
+                self._verified[key] = None
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return ok
+
+    def _run(self, pw_hash: str, password: str, submitted: float) -> bool:
+        started = time.perf_counter()
+        try:
+            return self.check(pw_hash, password)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.wait_seconds += started - submitted
+                self.run_seconds += finished - started
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "avg_wait_ms": self.wait_seconds / self.completed * 1000 if self.completed else None,
+                "avg_run_ms": self.run_seconds / self.completed * 1000 if self.completed else None,
+            }
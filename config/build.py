@@ -0,0 +1,169 @@
+"""
+config/*.py を検証して config/compiled.pickle へ書き出す
+
+    python -m config.build [out_path]
+"""
+from __future__ import annotations
+
+import importlib
+import pickle
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from config.compiled import COMPILED_PATH, LAZY_TABLES, dump_module, write_compiled
+from config.settings import SettingsError, normalize_settings
+
+PASSWORD_METHODS = ("scrypt", "pbkdf2")
+
+Problems = Tuple[List[str], List[str]]  # (エラー, 警告)
+
+
+def _check_links(where: str, links: Any, errors: List[str]) -> None:
+    if not isinstance(links, list):
+        errors.append(f"{where}: links がリストではありません")
+        return
+    for i, item in enumerate(links):
+        if not isinstance(item, dict) or not isinstance(item.get("link_url"), str):
+            errors.append(f"{where}: links[{i}] に link_url がありません")
+
+
+def _check_passwords(passwords: Any, errors: List[str]) -> None:
+    if not isinstance(passwords, dict):
+        errors.append("TOOL_PASSWORDS が辞書ではありません")
+        return
+    for machine_key, plans in passwords.items():
+        for plan_type, pw_hash in (plans or {}).items():
+            if (
+                not isinstance(pw_hash, str)
+                or pw_hash.count("$") != 2
+                or not pw_hash.startswith(PASSWORD_METHODS)
+            ):
+                errors.append(f"TOOL_PASSWORDS[{machine_key}][{plan_type}]: ハッシュ形式が不正です")
+
+
+# =========================================================
+# モジュールごとの検証
+# =========================================================
+def check_new_config(module: Any) -> Problems:
+    errors: List[str] = []
+    warnings: List[str] = []
+    names: Dict[str, str] = {}
+
+    for key, cfg in module.machine_configs.items():
+        where = f"machine_configs[{key}]"
+        if not isinstance(cfg, dict):
+            errors.append(f"{where}: 辞書ではありません")
+            continue
+        for field in ("display_name", "file_key"):
+            if not isinstance(cfg.get(field), str) or not cfg.get(field):
+                errors.append(f"{where}: {field} がありません")
+        if cfg.get("display_name") in names:
+            warnings.append(f"{where}: display_name が {names[cfg['display_name']]} と重複しています")
+        names.setdefault(cfg.get("display_name"), key)
+        settings = cfg.get("settings")
+        if not isinstance(settings, dict) or not settings.get("mode_options"):
+            errors.append(f"{where}: settings.mode_options がありません")
+        try:
+            normalize_settings(settings)
+        except SettingsError as e:
+            errors.append(f"{where}: {e}")
+        _check_links(where, cfg.get("links", []), errors)
+
+    _check_links("COMMON_LINKS", module.COMMON_LINKS, errors)
+    _check_passwords(module.TOOL_PASSWORDS, errors)
+    if not isinstance(module.NEW_TOOL_PASSWORD, str) or not module.NEW_TOOL_PASSWORD:
+        errors.append("NEW_TOOL_PASSWORD がありません")
+    return errors, warnings
+
+
+def check_old_config(module: Any) -> Problems:
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    for key, cfg in module.machine_configs.items():
+        where = f"machine_configs[{key}]"
+        if not isinstance(cfg, dict) or not cfg.get("display_name") or not cfg.get("file_key"):
+            errors.append(f"{where}: display_name / file_key がありません")
+            continue
+        settings = module.machine_settings.get(cfg["display_name"])
+        if not isinstance(settings, dict):
+            errors.append(f"{where}: machine_settings[{cfg['display_name']}] がありません")
+        elif not settings.get("mode_options"):
+            errors.append(f"machine_settings[{cfg['display_name']}]: mode_options がありません")
+
+    _check_passwords(module.TOOL_PASSWORDS, errors)
+    return errors, warnings
+
+
+def check_memo_config(module: Any) -> Problems:
+    errors: List[str] = []
+    warnings: List[str] = []
+    machine_keys = importlib.import_module("config.new_config").machine_configs
+
+    for key, memo in module.memo_configs.items():
+        where = f"memo_configs[{key}]"
+        if not isinstance(memo, dict) or not isinstance(memo.get("sections"), list):
+            errors.append(f"{where}: sections がありません")
+        if key not in machine_keys:
+            warnings.append(f"{where}: new_config.machine_configs にない機種です")
+    return errors, warnings
+
+
+CHECKS: Dict[str, Callable[[Any], Problems]] = {
+    "old_config": check_old_config,
+    "new_config": check_new_config,
+    "memo_config": check_memo_config,
+}
+
+
+def _check_roundtrip(module: Any, dumped: Dict[str, Any]) -> List[str]:
+    errors = []
+    for attr, table in dumped["tables"].items():
+        source = getattr(module, attr)
+        for key, blob in table["blobs"].items():
+            if pickle.loads(blob) != source[key]:
+                errors.append(f"{attr}[{key}]: 書き出し後に値が一致しません")
+    return errors
+
+
+# =========================================================
+# ビルド
+# =========================================================
+def build_all(out_path: str = COMPILED_PATH) -> int:
+    failed = 0
+    modules: Dict[str, Dict[str, Any]] = {}
+
+    for name in LAZY_TABLES:
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(f"config.{name}")
+            errors, warnings = CHECKS[name](module)
+            dumped = dump_module(name, module)
+            errors += _check_roundtrip(module, dumped)
+        except Exception as e:
+            errors, warnings = [f"{type(e).__name__}: {e}"], []
+
+        for message in warnings:
+            print(f"[WARN] {name}: {message}", file=sys.stderr)
+        if errors:
+            failed += 1
+            for message in errors:
+                print(f"[NG] {name}: {message}", file=sys.stderr)
+            continue
+
+        modules[name] = dumped
+        entries = sum(len(t["blobs"]) for t in dumped["tables"].values())
+        print(f"[OK] {name}: {entries} entries ({time.perf_counter() - started:.2f}s)")
+
+    # 1つでも失敗したら書き出さない（古いビルドは digest 不一致で .py にフォールバック）
+    if failed:
+        return failed
+
+    size = write_compiled(modules, out_path)
+    print(f"[OK] {out_path} ({size:,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(1 if build_all(*sys.argv[1:2]) else 0)
@@ -0,0 +1,261 @@
+"""
+設定モジュール（old_config / new_config / memo_config）の読み込み
+
+`python -m config.build` が各モジュールを検証して config/compiled.pickle に書き出す。
+実行時はそれを読み、機種ごとの大きな表は pickle bytes のまま持って
+初回参照時に1機種分だけ展開する（.py の巨大リテラルを毎回構築しない）。
+
+ビルド済みファイルが無い・ソースより古い場合は .py を import してフォールバックする。
+"""
+from __future__ import annotations
+
+import hashlib
+import importlib
+import os
+import pickle
+import sys
+from collections.abc import Mapping
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+COMPILED_PATH = os.path.join(CONFIG_DIR, "compiled.pickle")
+FORMAT_VERSION = 1
+
+# モジュール名 → 機種単位で遅延展開する表
+LAZY_TABLES: Dict[str, Tuple[str, ...]] = {
+    "old_config": ("machine_settings",),
+    "new_config": ("machine_configs",),
+    "memo_config": ("memo_configs",),
+}
+
+# 設定値として書き出す型（import した関数・モジュールは除く）
+DATA_TYPES = (dict, list, tuple, str, int, float, bool)
+
+_MISSING = object()
+_REJECTED = object()
+
+
+def source_path(name: str) -> str:
+    return os.path.join(CONFIG_DIR, name + ".py")
+
+
+def source_digest(name: str) -> str:
+    with open(source_path(name), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def public_names(module: Any) -> Tuple[str, ...]:
+    """
+    _ で始まらないデータ値 + __all__ の関数（__all__ に無い COMMON_LINKS なども含める）
+    """
+    exported = set(getattr(module, "__all__", ()))
+    return tuple(
+        n for n, v in vars(module).items()
+        if not n.startswith("_") and (isinstance(v, DATA_TYPES) or n in exported)
+    )
+
+
+def _summary(value: Any) -> Dict[str, Any]:
+    """
+    1機種分の設定のうち、文字列・数値の直下項目だけ（一覧表示用）
+    """
+    if not isinstance(value, dict):
+        return {}
+    return {k: v for k, v in value.items() if isinstance(v, (str, int, float, bool))}
+
+
+# =========================================================
+# 機種単位の遅延展開テーブル
+# =========================================================
+class LazyTable(Mapping):
+    """
+    key → 1機種分の設定。キー一覧と summary() は展開せずに引ける。
+    """
+
+    def __init__(self, blobs: Dict[str, bytes], summaries: Dict[str, Dict[str, Any]]):
+        self._blobs = blobs
+        self._summaries = summaries
+        self._values: Dict[str, Any] = {}
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "LazyTable":
+        table = cls(dict.fromkeys(values, b""), {k: _summary(v) for k, v in values.items()})
+        table._values.update(values)
+        return table
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            value = pickle.loads(self._blobs[key])
+            value = self._values.setdefault(key, value)
+        return value
+
+    def peek(self, key: str) -> Any:
+        """
+        展開済みの表に入れずに1機種分を読む（起動時に全機種を一度だけ見る用）
+        """
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            value = pickle.loads(self._blobs[key])
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._blobs)
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._blobs
+
+    def summary(self, key: str) -> Dict[str, Any]:
+        return self._summaries[key]
+
+    def summaries(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return iter(self._summaries.items())
+
+    def derive(self, build: Callable[[Any], Any], reject: Tuple[type, ...] = ()) -> "DerivedTable":
+        return DerivedTable(self, build, reject)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._blobs), "materialized": len(self._values)}
+
+
+class DerivedTable(Mapping):
+    """
+    LazyTable の各値に build() を当てた結果（これも初回参照時に作る）
+
+    build() が reject の例外を出したキーは、ログを1回出して「無いもの」として扱う。
+    """
+
+    def __init__(self, table: LazyTable, build: Callable[[Any], Any], reject: Tuple[type, ...] = ()):
+        self._table = table
+        self._build = build
+        self._reject = reject
+        self._values: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values.get(key, _MISSING)
+        if value is _MISSING:
+            try:
+                value = self._build(self._table[key])
+            except self._reject as e:
+                print(f"[config] {key}: {e}", file=sys.stderr)
+                value = _REJECTED
+            value = self._values.setdefault(key, value)
+        if value is _REJECTED:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self._table if key in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+
+# =========================================================
+# 書き出し（config.build から使う）
+# =========================================================
+def dump_module(name: str, module: Any) -> Dict[str, Any]:
+    """
+    公開値を pickle 可能な形にまとめる。
+    LAZY_TABLES の表は機種ごとに pickle bytes 化する。
+    """
+    lazy = LAZY_TABLES.get(name, ())
+    attrs: Dict[str, Any] = {}
+    tables: Dict[str, Dict[str, Any]] = {}
+    for attr in public_names(module):
+        value = getattr(module, attr)
+        if attr in lazy:
+            tables[attr] = {
+                "blobs": {k: pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for k, v in value.items()},
+                "summaries": {k: _summary(v) for k, v in value.items()},
+            }
+        else:
+            attrs[attr] = value
+    return {"digest": source_digest(name), "attrs": attrs, "tables": tables}
+
+
+def write_compiled(modules: Dict[str, Dict[str, Any]], path: str = COMPILED_PATH) -> int:
+    payload = pickle.dumps(
+        {"version": FORMAT_VERSION, "modules": modules},
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+# =========================================================
+# 読み込み
+# =========================================================
+_compiled: Optional[Dict[str, Any]] = None
+_loaded: Dict[str, SimpleNamespace] = {}
+ORIGINS: Dict[str, str] = {}
+
+
+def _read_compiled(path: str = COMPILED_PATH) -> Dict[str, Any]:
+    global _compiled
+    if _compiled is None:
+        try:
+            # 自分のビルドが書いたファイルだけを読む（外部入力ではない）
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            _compiled = data["modules"] if data.get("version") == FORMAT_VERSION else {}
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError):
+            _compiled = {}
+    return _compiled
+
+
+def _from_compiled(entry: Dict[str, Any]) -> SimpleNamespace:
+    values = dict(entry["attrs"])
+    for attr, table in entry["tables"].items():
+        values[attr] = LazyTable(table["blobs"], table["summaries"])
+    return SimpleNamespace(**values)
+
+
+def _from_source(name: str) -> SimpleNamespace:
+    module = importlib.import_module(f"config.{name}")
+    lazy = LAZY_TABLES.get(name, ())
+    return SimpleNamespace(**{
+        attr: LazyTable.from_dict(getattr(module, attr)) if attr in lazy else getattr(module, attr)
+        for attr in public_names(module)
+    })
+
+
+def load_config(name: str) -> SimpleNamespace:
+    """
+    config.<name> の公開値を属性に持つ名前空間（同じプロセスでは1回だけ読む）
+    """
+    loaded = _loaded.get(name)
+    if loaded is not None:
+        return loaded
+
+    entry = _read_compiled().get(name)
+    if entry is not None and entry["digest"] == source_digest(name):
+        loaded, origin = _from_compiled(entry), "compiled"
+    else:
+        print(f"[config] {name}: ビルド済みが無い/古いため .py から読み込みます", file=sys.stderr)
+        loaded, origin = _from_source(name), "source"
+
+    ORIGINS[name] = origin
+    return _loaded.setdefault(name, loaded)
+
+
+def stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, ns in _loaded.items():
+        tables = {attr: table.stats() for attr, table in vars(ns).items() if isinstance(table, LazyTable)}
+        out[name] = {"origin": ORIGINS.get(name), **tables}
+    return out
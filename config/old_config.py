@@ -1,6 +1,4 @@
 from __future__ import annotations
-from typing import Dict, Any
-from werkzeug.security import generate_password_hash
 
 # =========================================================
 # 機種ごとのURLキー・表示名・CSV読み込み用キー
@@ -1068,28 +1066,9 @@ machine_settings = {
 }
 
 # =========================================================
-# FREEプラン時のcustom_conditionラベル固定値
+# FREEプラン時のcustom_conditionラベル固定値（config.overrides に集約）
 # =========================================================
-FREE_CUSTOM_LABEL: str = "機種別条件"
-
-def apply_free_custom_label_override(
-    settings: Dict[str, Any],
-    display_name: str,
-    plan_type: str
-) -> Dict[str, Any]:
-    """
-    freeプランの場合、custom_conditionラベルを強制的に固定値に差し替える
-    """
-    if plan_type != "free":
-        return settings
-
-    # 元データを破壊しないようにコピー
-    new_settings = {**settings}
-    labels = {**settings.get("labels", {})}
-
-    labels["custom_condition"] = FREE_CUSTOM_LABEL
-    new_settings["labels"] = labels
-    return new_settings
+from config.overrides import FREE_CUSTOM_LABEL, apply_free_custom_label_override
 
 # =========================================================
 # ツールごとのパスワード（ハッシュ化）
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from typing import Dict, Any
+
+# =========================================================
+# FREEプラン時のcustom_conditionラベル固定値
+# =========================================================
+FREE_CUSTOM_LABEL: str = "機種別条件"
+
+def apply_free_custom_label_override(
+    settings: Dict[str, Any],
+    display_name: str,
+    plan_type: str
+) -> Dict[str, Any]:
+    """
+    freeプランの場合、custom_conditionラベルを強制的に固定値に差し替える
+    """
+    if plan_type != "free":
+        return settings
+
+    # 元データを破壊しないようにコピー
+    new_settings = {**settings}
+    labels = {**settings.get("labels", {})}
+
+    labels["custom_condition"] = FREE_CUSTOM_LABEL
+    new_settings["labels"] = labels
+    return new_settings
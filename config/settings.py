@@ -0,0 +1,228 @@
+"""
+settings を型付きの値へ正規化する
+
+new_config の settings は、範囲項目のタプルに3〜5項目の書き方が混在している:
+
+    (start, normal_max, step)                        初期値のみ（選択肢なし）
+    (start, normal_max, step, final_max)             最大側に final_max を追加
+    (start, normal_max, step, final_min, final_max)  両端に final_min / final_max を追加
+
+old_config の machine_settings（"1～500G" のようなラベル表記）は
+ラベル → 条件 (op, 値...) の表を作っておく。
+
+どちらもここで1回だけ解釈し、リクエスト処理では解釈しない。
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+
+# 範囲項目の未設定時の初期値（3項目 = 選択肢なし）
+RANGE_FALLBACKS: Dict[str, Tuple[int, ...]] = {
+    "through": (0, 5, 1),
+    "at_gap": (0, 1000, 50),
+    "prev_rb_game": (0, 2000, 50),
+    "prev_at_game": (0, 2000, 50),
+    "prev_at_coin": (0, 3000, 100),
+    "prev_diff": (-3000, 3000, 100),
+}
+
+GAME_FALLBACK: Tuple[int, ...] = (0, 1500, 50, 9999)
+
+DEFAULT_TIME_OPTIONS = ("朝イチ", "朝イチ以外")
+DEFAULT_PREV_RB_COIN: Dict[str, Optional[Tuple[int, int]]] = {"不問": None}
+
+
+class SettingsError(ValueError):
+    """
+    settings の書き方が不正（項目名を含むメッセージ）
+    """
+
+
+class RangeSetting(NamedTuple):
+    start: int
+    normal_max: int
+    step: int
+    min: int                  # 範囲の下限（5項目なら final_min）
+    max: int                  # 範囲の上限（4・5項目なら final_max）
+    extras: Tuple[int, ...]   # step 刻みの外に足す値
+    options: Tuple[int, ...]  # 画面の選択肢（3項目は空）
+
+
+def _is_int(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _int_tuple(field: str, value: Any, lengths: Tuple[int, ...]) -> Tuple[int, ...]:
+    if not isinstance(value, (tuple, list)) or len(value) not in lengths:
+        raise SettingsError(f"{field}: {lengths} 項目のタプルではありません: {value!r}")
+    if not all(_is_int(v) for v in value):
+        raise SettingsError(f"{field}: 整数以外が含まれています: {value!r}")
+    if value[2] <= 0:
+        raise SettingsError(f"{field}: step が0以下です: {value!r}")
+    if value[0] > value[1]:
+        raise SettingsError(f"{field}: start > normal_max です: {value!r}")
+    return tuple(value)
+
+
+def parse_range(field: str, value: Any) -> RangeSetting:
+    start, normal_max, step, *extras = _int_tuple(field, value, (3, 4, 5))
+    values = list(range(start, normal_max + 1, step))
+
+    if len(extras) == 2:
+        low, high = extras
+        if low not in values:
+            values.insert(0, low)
+    elif len(extras) == 1:
+        low, high = start, extras[0]
+    else:
+        low, high = start, normal_max
+
+    if high not in values:
+        values.append(high)
+
+    if low > high:
+        raise SettingsError(f"{field}: 最小値が最大値より大きいです: {value!r}")
+
+    return RangeSetting(
+        start, normal_max, step, low, high, tuple(extras),
+        options=tuple(values) if extras else (),
+    )
+
+
+def parse_game(value: Any) -> RangeSetting:
+    """
+    打ち出しG数: step 刻み（step から開始）+ 5項目目の追加値
+    """
+    start, normal_max, step, *rest = _int_tuple("game", value, (4, 5))
+    extras = tuple(rest[1:])
+    options = tuple(sorted({*extras, *range(step, normal_max + 1, step)}))
+    return RangeSetting(start, normal_max, step, options[0], options[-1], extras, options)
+
+
+def parse_prev_rb_coin(value: Any) -> Mapping[str, Optional[Tuple[int, int]]]:
+    if not isinstance(value, dict):
+        raise SettingsError(f"prev_rb_coin: 辞書ではありません: {value!r}")
+    out: Dict[str, Optional[Tuple[int, int]]] = {}
+    for label, bounds in value.items():
+        if bounds is None:
+            out[label] = None
+            continue
+        if (
+            not isinstance(bounds, (tuple, list))
+            or len(bounds) != 2
+            or not all(_is_int(v) for v in bounds)
+            or bounds[0] > bounds[1]
+        ):
+            raise SettingsError(f"prev_rb_coin[{label}]: (min, max) ではありません: {bounds!r}")
+        out[label] = tuple(bounds)
+    return MappingProxyType(out)
+
+
+def _options(field: str, value: Any) -> Tuple[str, ...]:
+    if not isinstance(value, (tuple, list)) or not all(isinstance(v, str) for v in value):
+        raise SettingsError(f"{field}: 文字列のリストではありません: {value!r}")
+    return tuple(value)
+
+
+def _number(field: str, value: Any, positive: bool = False):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (positive and value <= 0):
+        raise SettingsError(f"{field}: 数値が不正です: {value!r}")
+    return value
+
+
+# =========================================================
+# 1機種分の settings → 正規化済み settings（読み取り専用）
+# =========================================================
+def normalize_settings(settings: Mapping[str, Any]) -> Mapping[str, Any]:
+    """
+    キーは元の settings と同じ。範囲項目は RangeSetting、
+    選択肢はタプル、prev_rb_coin は (min, max) の読み取り専用dictになる。
+    未知のキーはそのまま残す。
+    """
+    if not isinstance(settings, Mapping):
+        raise SettingsError(f"settings が辞書ではありません: {settings!r}")
+
+    out: Dict[str, Any] = dict(settings)
+
+    out["exclude_games"] = _number("exclude_games", settings.get("exclude_games", 0))
+    out["coin_moti"] = _number("coin_moti", settings.get("coin_moti", 1), positive=True)
+    out["at_gap_width"] = _number("at_gap_width", settings.get("at_gap_width", 100))
+
+    out["mode_options"] = _options("mode_options", settings.get("mode_options", []))
+    out["time_options"] = _options("time_options", settings.get("time_options", DEFAULT_TIME_OPTIONS))
+    if not out["time_options"]:
+        raise SettingsError("time_options が空です")
+    out["custom_condition_options"] = _options(
+        "custom_condition_options", settings.get("custom_condition_options", [])
+    )
+    out["locked_fields"] = _options("locked_fields", settings.get("locked_fields", []))
+    out["help_texts"] = MappingProxyType(dict(settings.get("help_texts", {})))
+
+    out["game"] = parse_game(settings.get("game", GAME_FALLBACK))
+    for field, fallback in RANGE_FALLBACKS.items():
+        out[field] = parse_range(field, settings.get(field, fallback))
+    out["prev_rb_coin"] = parse_prev_rb_coin(settings.get("prev_rb_coin", DEFAULT_PREV_RB_COIN))
+
+    return MappingProxyType(out)
+
+
+
+# =========================================================
+# 旧ツール（old_config）の条件ラベル
+# =========================================================
+# フォーム項目 → 選択肢の設定キー
+LEGACY_OPTION_FIELDS: Dict[str, str] = {
+    "through": "through_options",
+    "at_gap": "at_gap_options",
+    "prev_game": "prev_game_options",
+    "prev_coin": "prev_coin_options",
+    "prev_diff": "prev_diff_options",
+    "prev_renchan": "prev_renchan_options",
+    "custom_condition": "custom_condition_options",
+}
+
+ANY_LABEL = "不問"
+
+
+@lru_cache(maxsize=1024)
+def parse_condition_label(label: str) -> Tuple:
+    """
+    "1～500G" → ("between", 1, 500) / "5スルー以上" → ("ge", 5)
+    "-2,001枚以下" → ("le", -2001) / "0スルー" → ("eq", 0)
+    """
+    s = label.replace(",", "").replace("枚", "").replace("G", "").replace("連", "").replace("スルー", "").strip()
+    try:
+        if "～" in s:
+            low, high = s.split("～")
+            return ("between", int(low), int(high))
+        if s.endswith("以下"):
+            return ("le", int(s[:-2]))
+        if s.endswith("以上"):
+            return ("ge", int(s[:-2]))
+        return ("eq", int(s))
+    except ValueError:
+        raise SettingsError(f"条件ラベルを解釈できません: {label!r}") from None
+
+
+def normalize_legacy_settings(settings: Mapping[str, Any]) -> Mapping[str, Any]:
+    """
+    machine_settings の1機種 → 元の値 + "conditions"（項目 → ラベル → 条件）
+    """
+    if not isinstance(settings, Mapping):
+        raise SettingsError(f"settings が辞書ではありません: {settings!r}")
+
+    out: Dict[str, Any] = dict(settings)
+    out["exclude_games"] = _number("exclude_games", settings.get("exclude_games", 0))
+    out["coin_moti"] = _number("coin_moti", settings.get("coin_moti", 1), positive=True)
+
+    conditions = {}
+    for field, key in LEGACY_OPTION_FIELDS.items():
+        labels = _options(key, settings.get(key, []))
+        conditions[field] = MappingProxyType({
+            label: parse_condition_label(label) for label in labels if label != ANY_LABEL
+        })
+    out["conditions"] = MappingProxyType(conditions)
+
+    return MappingProxyType(out)
@@ -0,0 +1,176 @@
+"""
+data/ 配下のCSVを列ごとの .npy バンドルへ変換する
+
+    python -m datastore.build [data_dir] [--force]
+
+変換はプロセスプールで並列に行う（DATA_BUILD_WORKERS、既定はCPU数）。
+CSVの内容（sha256）と型定義が前回と同じならスキップし、結果を
+data/manifest.json に記録する。--force で全件作り直す。
+"""
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from datastore.columnar import BUNDLE_VERSION, META_FILE, bundle_path, convert_csv, dtypes_for
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def find_csv_files(data_dir: str = "data"):
+    files = glob.glob(os.path.join(data_dir, "*.csv"))
+    files += glob.glob(os.path.join(data_dir, "*", "*.csv"))
+    return sorted(files)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def has_rows(path: str) -> bool:
+    """
+    ヘッダーだけのCSV（data/機種名.csv のような雛形）は変換しない
+    """
+    with open(path, "rb") as f:
+        f.readline()
+        return bool(f.readline().strip())
+
+
+def schema_digest(dtypes: Dict[str, str]) -> str:
+    """
+    型定義・バンドルの書式が変わったら内容が同じCSVでも作り直す
+    """
+    payload = json.dumps([BUNDLE_VERSION, sorted(dtypes.items())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# =========================================================
+# マニフェスト（CSV → 変換時のハッシュ・行数など）
+# =========================================================
+def manifest_path(data_dir: str) -> str:
+    return os.path.join(data_dir, MANIFEST_FILE)
+
+
+def read_manifest(data_dir: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(manifest_path(data_dir), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def write_manifest(data_dir: str, files: Dict[str, Dict[str, Any]]) -> None:
+    path = manifest_path(data_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": MANIFEST_VERSION, "files": dict(sorted(files.items()))},
+            f, ensure_ascii=False, indent=1,
+        )
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(entry: Optional[Dict[str, Any]], digest: str, schema: str, csv_path: str) -> bool:
+    return (
+        entry is not None
+        and entry.get("sha256") == digest
+        and entry.get("schema") == schema
+        and os.path.isfile(os.path.join(bundle_path(csv_path), META_FILE))
+    )
+
+
+def touch_bundle(csv_path: str) -> None:
+    """
+    内容が同じCSVを置き直しただけの場合、バンドルの mtime を進めて
+    fresh_bundle()（mtime比較）が古いと判定しないようにする
+    """
+    meta_path = os.path.join(bundle_path(csv_path), META_FILE)
+    if os.path.getmtime(meta_path) < os.path.getmtime(csv_path):
+        os.utime(meta_path)
+
+
+# =========================================================
+# 1ファイルの変換（プロセスプールの子で実行）
+# =========================================================
+def convert_one(csv_path: str, dtypes: Dict[str, str]) -> Tuple[int, List[str], float]:
+    started = time.perf_counter()
+    out_dir = convert_csv(csv_path, dtypes)
+    with open(os.path.join(out_dir, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    columns = [col["name"] for col in meta["columns"]]
+    return meta["rows"], columns, time.perf_counter() - started
+
+
+def build_all(data_dir: str = "data", force: bool = False, workers: Optional[int] = None) -> int:
+    started = time.perf_counter()
+    previous = read_manifest(data_dir)
+    manifest: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, Dict[str, Any]] = {}
+    dtypes: Dict[str, Dict[str, str]] = {}
+    skipped = 0
+
+    for path in find_csv_files(data_dir):
+        if not has_rows(path):
+            print(f"[SKIP] {path}: データ行がありません")
+            continue
+        key = os.path.relpath(path, data_dir)
+        dtypes[path] = dtypes_for(path, data_dir)
+        entry = {"sha256": file_digest(path), "schema": schema_digest(dtypes[path])}
+        if not force and is_unchanged(previous.get(key), entry["sha256"], entry["schema"], path):
+            touch_bundle(path)
+            manifest[key] = previous[key]
+            skipped += 1
+        else:
+            pending[path] = entry
+
+    failed = 0
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending) or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_one, path, dtypes[path]): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                rows, columns, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[NG] {path}: {e}", file=sys.stderr)
+                continue
+            key = os.path.relpath(path, data_dir)
+            manifest[key] = dict(
+                pending[path],
+                bundle=os.path.relpath(bundle_path(path), data_dir),
+                rows=rows,
+                columns=columns,
+            )
+            print(f"[OK] {path} -> {bundle_path(path)} ({rows:,} rows, {seconds:.2f}s)")
+
+    # 失敗したCSVは記録しない（次回また変換を試みる）
+    write_manifest(data_dir, manifest)
+    print(
+        f"[OK] {len(pending) - failed} converted, {skipped} unchanged, {failed} failed "
+        f"({workers} workers, {time.perf_counter() - started:.2f}s) -> {manifest_path(data_dir)}"
+    )
+    return failed
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    sys.exit(1 if build_all(
+        *args[:1],
+        force="--force" in sys.argv[1:],
+        workers=int(os.environ.get("DATA_BUILD_WORKERS", "0")) or None,
+    ) else 0)
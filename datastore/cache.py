@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def value_nbytes(value: Any) -> int:
+    """
+    DataFrame は memory_usage、Dataset など nbytes を持つものはそれを使う
+    """
+    if isinstance(value, pd.DataFrame):
+        return frame_nbytes(value)
+    return int(value.nbytes)
+
+
+# =========================================================
+# サイズ上限付きLRUキャッシュ（DATA_CACHE用）
+# =========================================================
+class DatasetCache:
+    """
+    key（CSVパス）→ (version, 値) を保持するLRUキャッシュ。
+    合計サイズ（sizeofで計測）が max_bytes を超えたら、pin されていない古いものから捨てる。
+
+    値が on_resize 属性を持つ場合（Dataset）は、put 後にキューブや範囲ビットマップが
+    増えたときに呼ばれるよう resize() を登録し、サイズを測り直す。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        pinned: Iterable[str] = (),
+        sizeof: Callable[[Any], int] = value_nbytes,
+    ):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._pinned = set(pinned)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, version: Optional[float] = None) -> Optional[Any]:
+        """
+        version=None なら版を問わず現在の値を返す（版の確認は DatasetRegistry が裏で行う）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (version is not None and entry[0] != version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, version: float, value: Any) -> None:
+        nbytes = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[2]
+            self._entries[key] = (version, value, nbytes)
+            self.total_bytes += nbytes
+            self._evict(keep=key)
+        if hasattr(value, "on_resize"):
+            value.on_resize = functools.partial(self.resize, key, value)
+
+    def resize(self, key: str, value: Any) -> None:
+        """
+        保持中の値が大きくなった（派生データを後から作った）ときに測り直す
+        """
+        nbytes = self.sizeof(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is not value:
+                return  # 既に捨てた・差し替えた
+            self.total_bytes += nbytes - entry[2]
+            self._entries[key] = (entry[0], value, nbytes)
+            self._evict(keep=key)
+
+    def peek(self, key: str) -> Optional[Any]:
+        """
+        LRUの順序・ヒット率を変えずに現在の値を見る
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def _evict(self, keep: str) -> None:
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                return
+            if key == keep or key in self._pinned:
+                continue
+            _, _, nbytes = self._entries.pop(key)
+            self.total_bytes -= nbytes
+            self.evictions += 1
+
+    # =========================
+    # pin（人気機種を常駐させる）
+    # =========================
+    def pin(self, key: str) -> None:
+        with self._lock:
+            self._pinned.add(key)
+
+    def unpin(self, key: str) -> None:
+        with self._lock:
+            self._pinned.discard(key)
+            self._evict(keep="")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pinned": len(self._pinned),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# =========================================================
+# クエリ結果キャッシュ（件数上限LRU + TTL）
+# =========================================================
+class ResultCache:
+    """
+    正規化したクエリキー → 結果（JSON化できる値）。
+
+    shared（SharedResultStore）を渡すと、プロセス内で外れたときに
+    共有ストアも引き、書き込みは両方に行う（gunicorn worker間で共有）。
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        shared: Optional["SharedResultStore"] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expired += 1
+
+        if self.shared is not None:
+            found = self.shared.get(key)
+            if found is not None:
+                value, remaining = found
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, value, now + remaining)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value, self.clock() + self.ttl)
+        if self.shared is not None:
+            self.shared.put(key, value, self.ttl)
+
+    def _store(self, key: str, value: Any, expires: float) -> None:
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+class SharedResultStore:
+    """
+    worker間で共有するSQLiteファイル（値はJSON、期限はUNIX時刻）
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._puts = 0
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _execute(self, *statements: Tuple) -> Optional[tuple]:
+        """
+        (sql, params) を1トランザクションで実行し、最後の文の1行目を返す
+        """
+        statements = [(st, ()) if isinstance(st, str) else st for st in statements]
+        conn = sqlite3.connect(self.path, timeout=1.0)
+        try:
+            with conn:
+                for sql, params in statements:
+                    cursor = conn.execute(sql, params)
+                return cursor.fetchone()
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        (値, 残りTTL秒) or None
+        """
+        try:
+            row = self._execute(("SELECT value, expires FROM results WHERE key = ?", (key,)))
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return None
+        return json.loads(row[0]), remaining
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        self._puts += 1
+        statements = [(
+            "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl),
+        )]
+        if self._puts % self.PRUNE_EVERY == 0:
+            statements.append(("DELETE FROM results WHERE expires <= ?", (now,)))
+        try:
+            self._execute(*statements)
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from datastore.layout import sort_frame
+
+# =========================================================
+# CSV列の型定義（machine_page / all_tool 共通）
+# =========================================================
+LEGACY_DTYPES: Dict[str, str] = {
+    "朝イチ": "int8",
+    "スルー回数": "int16",
+    "AT間ゲーム数": "int32",
+    "前回当選ゲーム数": "int32",
+    "前回獲得枚数": "int32",
+    "前回差枚数": "int32",
+    "前回連荘数": "int16",
+    "当該REGゲーム数": "int32",
+    "REGゲーム数": "float32",
+    "ATゲーム数": "float32",
+    "REG枚数": "float32",
+    "AT枚数": "float32",
+}
+
+ALL_DTYPES: Dict[str, str] = {
+    "朝イチ": "int8",
+    "スルー回数": "int16",
+    "AT間ゲーム数": "int32",
+    "前回AT当選ゲーム数": "int32",
+    "前回AT獲得枚数": "int32",
+    "前回REG当選ゲーム数": "int32",
+    "前回REG獲得枚数": "int32",
+    "前回差枚数": "int32",
+    "前回連荘数": "int16",
+    "当該REGゲーム数": "int32",
+    "REGゲーム数": "float32",
+    "ATゲーム数": "float32",
+    "REG枚数": "float32",
+    "AT枚数": "float32",
+}
+
+BUNDLE_SUFFIX = ".cols"
+META_FILE = "meta.json"
+# バンドルの書式（変えたら datastore.build が全件作り直す）
+BUNDLE_VERSION = 2
+
+# CSVは この行数ずつ読む（読み込み中のピークは「型付きの列 + 1チャンク分」に収まる）
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", "50000"))
+
+
+def dtypes_for(csv_path: str, data_dir: str = "data") -> Dict[str, str]:
+    """
+    <data_dir>/<file_key>/<suffix>.csv → all_tool用、<data_dir>/<file_key>_<suffix>.csv → 旧ツール用
+    （ディレクトリ名ではなく data_dir からの深さで決める）
+    """
+    rel = os.path.relpath(os.path.abspath(csv_path), os.path.abspath(data_dir))
+    return LEGACY_DTYPES if os.path.dirname(rel) == "" else ALL_DTYPES
+
+
+def bundle_path(csv_path: str) -> str:
+    """
+    data/bigdream/cz.csv → data/bigdream/cz.cols
+    """
+    stem, _ = os.path.splitext(csv_path)
+    return stem + BUNDLE_SUFFIX
+
+
+# =========================================================
+# CSV → 列ごとの .npy バンドル変換
+# =========================================================
+def write_bundle(df: pd.DataFrame, out_dir: str, source: str = "") -> None:
+    # 当該REGゲーム数順に並べて保存（ロード時のソートを省く）
+    df = sort_frame(df)
+
+    tmp_dir = out_dir + ".tmp"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        file_name = f"{i:02d}.npy"
+        col = {"name": name, "file": file_name}
+        values = df[name].to_numpy()
+        if values.dtype == object or not isinstance(values.dtype, np.dtype):
+            # 文字列列は辞書化してコードで保存（mmapしてもゼロコピーで読める）
+            if isinstance(df[name].dtype, pd.CategoricalDtype):
+                cat = df[name].array
+            else:
+                cat = pd.Categorical(df[name].astype(str))
+            values = cat.codes.astype(np.int8 if len(cat.categories) < 128 else np.int16)
+            col["categories"] = [str(c) for c in cat.categories]
+        np.save(os.path.join(tmp_dir, file_name), values, allow_pickle=False)
+        col["dtype"] = values.dtype.str
+        columns.append(col)
+
+    meta = {
+        "source": os.path.basename(source),
+        "version": BUNDLE_VERSION,
+        "rows": int(len(df)),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+
+
+# =========================================================
+# CSVのチャンク読み込み
+# =========================================================
+class _Codes:
+    """
+    文字列列をチャンクをまたいで同じ辞書でコード化する（欠損は -1）
+    """
+
+    def __init__(self):
+        self.lookup: Dict[str, int] = {}
+        self.parts: List[np.ndarray] = []
+
+    def add(self, series: pd.Series) -> None:
+        codes, uniques = pd.factorize(series.astype(str))
+        mapping = np.array([self.lookup.setdefault(u, len(self.lookup)) for u in uniques] + [-1], dtype=np.int32)
+        # factorize の欠損 -1 は mapping の末尾（-1）を指す
+        self.parts.append(mapping[codes].astype(np.int16 if len(self.lookup) < 32768 else np.int32))
+
+    def finish(self) -> pd.Categorical:
+        # 辞書はソート順に並べ直す（pd.Categorical(文字列) と同じカテゴリ順）
+        categories = sorted(self.lookup)
+        remap = np.empty(len(categories) + 1, dtype=np.int32)
+        remap[[self.lookup[c] for c in categories]] = np.arange(len(categories))
+        remap[-1] = -1
+        codes = remap[np.concatenate(self.parts)] if self.parts else np.empty(0, dtype=np.int32)
+        small = np.int8 if len(categories) < 128 else np.int16 if len(categories) < 32768 else np.int32
+        return pd.Categorical.from_codes(codes.astype(small), categories=categories, validate=False)
+
+
+def _is_text(series: pd.Series) -> bool:
+    return not pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+
+
+class _TextColumn(Exception):
+    """
+    型定義に無い列が、途中のチャンクで文字列だと分かった
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = name
+
+
+def read_csv_chunked(
+    csv_path: str,
+    dtypes: Optional[dict] = None,
+    usecols: Optional[list] = None,
+    chunksize: int = CSV_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    pd.read_csv を chunksize 行ずつ読み、チャンクごとに
+    - 型定義に無い整数列は値が収まる最小の整数型へ（int64 → int8 など）
+    - 文字列列（前回種別など）は辞書コード化
+    してから列ごとに連結する。object型の文字列を全行分持つことはない。
+
+    型定義に無い列の種類は最初のチャンクから推定する。先頭が空欄ばかりで数値と
+    推定した列に後から文字列が出てきたら、その列を文字列として読み直す。
+    """
+    dtypes = dict(dtypes or {})
+    text_columns: List[str] = []
+    while True:
+        try:
+            return _read_chunks(csv_path, dtypes, text_columns, usecols, chunksize)
+        except _TextColumn as e:
+            text_columns.append(e.name)
+
+
+def _read_chunks(
+    csv_path: str,
+    dtypes: Dict[str, str],
+    text_columns: List[str],
+    usecols: Optional[list],
+    chunksize: int,
+) -> pd.DataFrame:
+    read_dtypes = dict(dtypes, **{name: "str" for name in text_columns})
+    parts: Dict[str, List[np.ndarray]] = {}
+    texts: Dict[str, _Codes] = {}
+
+    for chunk in pd.read_csv(csv_path, dtype=read_dtypes, usecols=usecols, chunksize=chunksize):
+        for name in chunk.columns:
+            series = chunk[name]
+            if name in texts or name in text_columns or (
+                name not in parts and name not in dtypes and _is_text(series)
+            ):
+                texts.setdefault(name, _Codes()).add(series)
+                continue
+            if _is_text(series):
+                if name not in dtypes:
+                    raise _TextColumn(name)
+                raise ValueError(f"{name}: 数値列に数値以外の値があります")
+            values = series.to_numpy()
+            if name not in dtypes and values.dtype.kind in "iu":
+                # 連結時に大きい方の型へそろうので、チャンクごとに縮めてよい
+                values = pd.to_numeric(values, downcast="integer")
+            parts.setdefault(name, []).append(values)
+        order = list(chunk.columns)
+
+    if not parts and not texts:
+        return pd.read_csv(csv_path, dtype=read_dtypes, usecols=usecols, nrows=0)
+
+    data = {}
+    for name in order:
+        if name in texts:
+            data[name] = texts[name].finish()
+            continue
+        data[name] = np.concatenate(parts.pop(name))
+    return pd.DataFrame(data, copy=False)
+
+
+def missing_columns(csv_path: str, dtypes: Dict[str, str]) -> List[str]:
+    """
+    型定義にあってCSVのヘッダーに無い列（read_csv は dtype の余分なキーを黙って無視する）
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return [name for name in dtypes if name not in header]
+
+
+def convert_csv(csv_path: str, dtypes: Optional[dict] = None, data_dir: str = "data") -> str:
+    if dtypes is None:
+        dtypes = dtypes_for(csv_path, data_dir)
+    missing = missing_columns(csv_path, dtypes)
+    if missing:
+        raise ValueError(f"列がありません: {', '.join(missing)}")
+    df = read_csv_chunked(csv_path, dtypes)
+    out_dir = bundle_path(csv_path)
+    write_bundle(df, out_dir, source=csv_path)
+    return out_dir
+
+
+# =========================================================
+# 読み込み（バンドル優先・CSVフォールバック）
+# =========================================================
+def read_bundle(out_dir: str, usecols: Optional[List[str]] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    mmap=True の場合は各列を読み取り専用でmmapし、コピーせずにDataFrame化する。
+    ページはOSのページキャッシュ上にあるため、gunicornの全workerで共有される。
+    """
+    with open(os.path.join(out_dir, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    data = {}
+    for col in meta["columns"]:
+        if usecols is not None and col["name"] not in usecols:
+            continue
+        values = np.load(
+            os.path.join(out_dir, col["file"]),
+            mmap_mode="r" if mmap else None,
+            allow_pickle=False,
+        )
+        if "categories" in col:
+            values = pd.Series(
+                pd.Categorical.from_codes(values, categories=col["categories"], validate=False),
+                copy=False,
+            )
+        data[col["name"]] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def fresh_bundle(csv_path: str) -> Optional[str]:
+    """
+    CSVより新しい変換済みバンドルがあればそのパスを返す
+    """
+    out_dir = bundle_path(csv_path)
+    meta_path = os.path.join(out_dir, META_FILE)
+    try:
+        bundle_mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    try:
+        csv_mtime = os.path.getmtime(csv_path)
+    except OSError:
+        return out_dir
+    return out_dir if bundle_mtime >= csv_mtime else None
+
+
+def source_mtime(csv_path: str) -> float:
+    out_dir = fresh_bundle(csv_path)
+    if out_dir:
+        return os.path.getmtime(os.path.join(out_dir, META_FILE))
+    return os.path.getmtime(csv_path)
+
+
+def read_table(csv_path: str, dtypes: Optional[dict] = None, usecols: Optional[list] = None) -> pd.DataFrame:
+    out_dir = fresh_bundle(csv_path)
+    if out_dir:
+        return read_bundle(out_dir, usecols=usecols)
+    return read_csv_chunked(csv_path, dtypes=dtypes, usecols=usecols)
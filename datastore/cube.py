@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore.index import category_codes
+
+# 期待値計算に使う列（件数と合計だけあれば平均が出せる）
+AGG_COLUMNS = ("REGゲーム数", "ATゲーム数", "REG枚数", "AT枚数")
+
+# all_tool の min/max 指定項目 → CSV列
+RANGE_FIELDS = {
+    "prev_rb_game": "前回REG当選ゲーム数",
+    "prev_at_game": "前回AT当選ゲーム数",
+    "prev_at_coin": "前回AT獲得枚数",
+    "prev_diff": "前回差枚数",
+}
+
+# 天井条件 → 前回種別
+PREV_TYPE_BY_TIME = {"下位後": "下位", "上位後": "上位"}
+
+
+class Aggregate:
+    """
+    件数と AGG_COLUMNS の合計
+    """
+
+    def __init__(self, count: int, sums: np.ndarray):
+        self.count = int(count)
+        self.sums = sums
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Aggregate":
+        sums = np.array([df[c].to_numpy().sum(dtype=np.float64) for c in AGG_COLUMNS])
+        return cls(len(df), sums)
+
+    def mean(self, column: str) -> float:
+        return float(self.sums[AGG_COLUMNS.index(column)] / self.count)
+
+
+# =========================================================
+# 事前集計キューブ（機種×モードごと）
+# =========================================================
+class ResultCube:
+    """
+    all_tool のフォームで選べる離散条件ごとに、件数と合計を事前集計しておく。
+
+    次元:
+      朝イチ / 前回連荘数==1 / 前回種別 / スルー回数
+      打ち出しG数のしきい値ビン（game_options + exclude_games）
+      範囲項目ごとの「設定の初期範囲内か」フラグ（ビット）
+
+    表現できない条件（範囲を初期値から変更、AT間G数、機種別条件など）は
+    lookup() が None を返すので、呼び出し側で行フィルタにフォールバックする。
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        exclude_games: int,
+        game_options: Iterable[int],
+        range_defaults: Dict[str, Tuple[int, int]],
+    ):
+        self.exclude_games = exclude_games
+        self.range_defaults = dict(range_defaults)
+        self.range_bits = {field: 1 << i for i, field in enumerate(self.range_defaults)}
+        self.edges = np.array(sorted({int(g) + exclude_games for g in game_options}), dtype=np.int64)
+
+        # 前回種別は整数コードのまま使う（行ごとの文字列を作らない）
+        type_codes, self.type_codes = category_codes(df["前回種別"])
+
+        flags = np.zeros(len(df), dtype=np.int64)
+        for field, (low, high) in self.range_defaults.items():
+            values = df[RANGE_FIELDS[field]].to_numpy()
+            flags |= ((values >= low) & (values <= high)).astype(np.int64) * self.range_bits[field]
+
+        keys = {
+            "asa": df["朝イチ"].to_numpy().astype(np.int64),
+            "ren1": (df["前回連荘数"].to_numpy() == 1).astype(np.int64),
+            "type": type_codes.astype(np.int64),
+            "through": df["スルー回数"].to_numpy().astype(np.int64),
+            "flags": flags,
+            "bin": np.searchsorted(self.edges, df["当該REGゲーム数"].to_numpy(), side="right") - 1,
+        }
+
+        stacked = np.stack(list(keys.values()), axis=1)
+        cells, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.cells = {name: cells[:, i] for i, name in enumerate(keys)}
+        self.counts = np.bincount(inverse, minlength=len(cells)).astype(np.int64)
+        self.sums = np.stack([
+            np.bincount(inverse, weights=df[c].to_numpy().astype(np.float64), minlength=len(cells))
+            for c in AGG_COLUMNS
+        ])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.cells.values()) + self.counts.nbytes + self.sums.nbytes
+
+    def lookup(self, form: dict, settings: dict) -> Optional[Aggregate]:
+        locked_ui_fields = form.get("locked_ui_fields", [])
+        select = np.ones(len(self.counts), dtype=bool)
+
+        # =========================
+        # 朝イチ
+        # =========================
+        time_value = form.get("time")
+        if time_value == "朝イチ":
+            select &= self.cells["asa"] == 1
+        elif time_value in ("朝イチ以外", "駆け抜け後", *PREV_TYPE_BY_TIME):
+            select &= self.cells["asa"] == 0
+            if time_value == "駆け抜け後":
+                select &= self.cells["ren1"] == 1
+            elif time_value in PREV_TYPE_BY_TIME:
+                code = self.type_codes.get(PREV_TYPE_BY_TIME[time_value])
+                if code is None:
+                    return Aggregate(0, np.zeros(len(AGG_COLUMNS)))
+                select &= self.cells["type"] == code
+
+        # =========================
+        # スルー回数
+        # =========================
+        through_value = form.get("through")
+        if "through" not in locked_ui_fields and through_value not in (None, "", "all", "不問"):
+            try:
+                select &= self.cells["through"] == int(through_value)
+            except (TypeError, ValueError):
+                pass
+
+        # =========================
+        # キューブで表せない条件 → フォールバック
+        # =========================
+        if "at_gap" not in locked_ui_fields:
+            at_gap_raw = form.get("at_gap", "不問")
+            if at_gap_raw not in (None, "", "不問", "all"):
+                try:
+                    int(at_gap_raw)
+                    return None
+                except (TypeError, ValueError):
+                    pass
+
+        if "prev_rb_coin" not in locked_ui_fields:
+            if settings.get("prev_rb_coin", {}).get(form.get("prev_rb_coin", "不問")) is not None:
+                return None
+
+        if "custom_condition" not in locked_ui_fields:
+            if form.get("custom_condition") and form.get("custom_condition") != "不問":
+                return None
+
+        # =========================
+        # 範囲項目（初期範囲 or ロックのみ対応）
+        # =========================
+        required = 0
+        for field, default in self.range_defaults.items():
+            if f"{field}_min" in locked_ui_fields or f"{field}_max" in locked_ui_fields:
+                continue
+            val = form.get(field)
+            if not val or len(val) != 2:
+                continue
+            if tuple(val) != tuple(default):
+                return None
+            required |= self.range_bits[field]
+        if required:
+            select &= (self.cells["flags"] & required) == required
+
+        # =========================
+        # 打ち出しG数
+        # =========================
+        game_value = form.get("game", "不問")
+        try:
+            game = 0 if game_value in ("不問", "", None) else int(game_value)
+        except (TypeError, ValueError):
+            game = 0
+        threshold = game + self.exclude_games
+        pos = int(np.searchsorted(self.edges, threshold))
+        if pos >= len(self.edges) or self.edges[pos] != threshold:
+            return None
+        select &= self.cells["bin"] >= pos
+
+        return Aggregate(self.counts[select].sum(), self.sums[:, select].sum(axis=1))
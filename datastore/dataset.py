@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from datastore.cache import frame_nbytes
+from datastore.cube import ResultCube
+from datastore.index import BitmapIndex
+from datastore.layout import PrefixSums, SortedQuery, is_sorted, sort_frame
+
+
+# =========================================================
+# 1CSV分のデータ（DataFrame + 検索用の索引・集計）
+# =========================================================
+class Dataset:
+    def __init__(self, frame: pd.DataFrame, version: float = 0.0):
+        # 元データの版（source_mtime）。クエリ結果キャッシュのキーに使う
+        self.version = version
+        # バンドルは変換時にソート済み。CSVから読んだ場合だけここで並べ替える
+        self.frame = sort_frame(frame)
+        self._frame_nbytes = frame_nbytes(self.frame)
+        self.index = BitmapIndex(self.frame)
+        self.prefix: Optional[PrefixSums] = None
+        if is_sorted(self.frame):
+            try:
+                self.prefix = PrefixSums(self.frame)
+            except KeyError:
+                pass
+        self._cubes: Dict[str, Optional[ResultCube]] = {}
+        self._builders: Dict[str, Callable[[pd.DataFrame], ResultCube]] = {}
+        self._lock = threading.Lock()
+        # キューブ・範囲ビットマップが増えたときに呼ぶ（DatasetCache.put が設定する）
+        self.on_resize: Optional[Callable[[], None]] = None
+        self.index.on_resize = self._resized
+
+    def _resized(self) -> None:
+        if self.on_resize is not None:
+            self.on_resize()
+
+    def cube(self, key: str, build: Callable[[pd.DataFrame], ResultCube]) -> Optional[ResultCube]:
+        """
+        機種ごとの事前集計キューブ（初回に構築、列が足りなければNone）
+        """
+        built = False
+        with self._lock:
+            if key not in self._cubes:
+                self._builders[key] = build
+                try:
+                    self._cubes[key] = build(self.frame)
+                except KeyError:
+                    self._cubes[key] = None
+                built = self._cubes[key] is not None
+            cube = self._cubes[key]
+        if built:
+            self._resized()
+        return cube
+
+    def prepare_like(self, other: "Dataset") -> None:
+        """
+        差し替え前の版で作られていたキューブを、新しい版でも先に作っておく
+        """
+        with other._lock:
+            builders = dict(other._builders)
+        for key, build in builders.items():
+            self.cube(key, build)
+
+    def sorted_query(self) -> SortedQuery:
+        return SortedQuery(self.frame, self.index, self.prefix)
+
+    @property
+    def nbytes(self) -> int:
+        cubes = sum(c.nbytes for c in self._cubes.values() if c is not None)
+        prefix = self.prefix.nbytes if self.prefix is not None else 0
+        return self._frame_nbytes + self.index.nbytes + prefix + cubes
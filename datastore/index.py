@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 値ごとのビットマップを事前構築する低カーディナリティ列
+EQ_COLUMNS = ("朝イチ", "スルー回数", "前回連荘数", "前回種別", "機種別条件")
+EQ_MAX_CARDINALITY = 64
+
+# 範囲条件（le/lt）のビットマップは初回利用時に作り、件数上限付きで保持する
+RANGE_CACHE_SIZE = 256
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    """
+    bool配列 → uint64ワード列（末尾は0埋め）
+    """
+    packed = np.packbits(mask)
+    pad = (-len(packed)) % 8
+    if pad:
+        packed = np.concatenate([packed, np.zeros(pad, dtype=np.uint8)])
+    return packed.view(np.uint64)
+
+
+def is_text(series: pd.Series) -> bool:
+    return not pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+
+
+def category_codes(series: pd.Series) -> Tuple[np.ndarray, Dict[object, int]]:
+    """
+    文字列列 → (行ごとの整数コード, 値 → コード)。欠損は -1。
+    Categorical（バンドル・read_csv_chunked の文字列列）はコードをそのまま使う。
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.array.codes, {v: i for i, v in enumerate(series.cat.categories)}
+    codes, uniques = pd.factorize(series)
+    return codes, {v: i for i, v in enumerate(uniques)}
+
+
+# どのコードにも一致しない値（欠損の -1 とも別）
+NO_CODE = -2
+
+
+# =========================================================
+# パック済みビットマップ索引
+# =========================================================
+class BitmapIndex:
+    """
+    1データセット分の述語ビットマップ。
+
+    - EQ_COLUMNS の各値 → 一致行のビットマップ（ロード時に構築）
+    - 範囲列の (le|lt, しきい値) → ビットマップ（初回に構築してLRU保持）
+
+    between / ge はしきい値ビットマップ2本のAND/NOTで解決するため、
+    2回目以降は行を走査しない。
+
+    文字列列（前回種別など）は整数コードで持ち、条件の値は 値 → コード の表で
+    1回だけコードに直してから整数比較する。
+    """
+
+    def __init__(self, df: pd.DataFrame, eq_columns: Iterable[str] = EQ_COLUMNS):
+        self.rows = len(df)
+        self._words = (self.rows + 63) // 64
+        self._columns: Dict[str, np.ndarray] = {}
+        self._codes: Dict[str, Dict[object, int]] = {}
+        self._eq: Dict[str, Dict[object, np.ndarray]] = {}
+        self._range: "OrderedDict[Tuple[str, str, float], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 範囲ビットマップを足したときに呼ぶ（Dataset がキャッシュのサイズ更新につなぐ）
+        self.on_resize: Optional[Callable[[], None]] = None
+
+        for name in df.columns:
+            series = df[name]
+            if is_text(series):
+                self._columns[name], self._codes[name] = category_codes(series)
+            else:
+                self._columns[name] = series.to_numpy()
+
+        for name in eq_columns:
+            if name in df.columns:
+                self._build_eq(name)
+
+        self._full = _pack(np.ones(self.rows, dtype=bool))
+        self._empty = np.zeros(self._words, dtype=np.uint64)
+
+    def _build_eq(self, name: str) -> None:
+        values = self._columns[name]
+        codes = self._codes.get(name)
+        if codes is not None:
+            if len(codes) > EQ_MAX_CARDINALITY:
+                return
+            self._eq[name] = {v: _pack(values == code) for v, code in codes.items()}
+            return
+        uniques = np.unique(values)
+        if len(uniques) > EQ_MAX_CARDINALITY:
+            return
+        self._eq[name] = {
+            (v.item() if isinstance(v, np.generic) else v): _pack(values == v) for v in uniques
+        }
+
+    @property
+    def nbytes(self) -> int:
+        bitmaps = sum(len(m) for m in self._eq.values()) + len(self._range) + 2
+        return bitmaps * self._words * 8
+
+    # =========================
+    # 基本ビットマップ
+    # =========================
+    def full(self) -> np.ndarray:
+        return self._full
+
+    def eq(self, column: str, value) -> np.ndarray:
+        bitmaps = self._eq.get(column)
+        if bitmaps is not None:
+            return bitmaps.get(value, self._empty)
+        return self._threshold("eq", column, value)
+
+    def le(self, column: str, value) -> np.ndarray:
+        return self._threshold("le", column, value)
+
+    def lt(self, column: str, value) -> np.ndarray:
+        return self._threshold("lt", column, value)
+
+    def ge(self, column: str, value) -> np.ndarray:
+        return ~self.lt(column, value)
+
+    def between(self, column: str, low, high) -> np.ndarray:
+        return self.le(column, high) & ~self.lt(column, low)
+
+    def _threshold(self, op: str, column: str, value) -> np.ndarray:
+        key = (op, column, value)
+        with self._lock:
+            bits = self._range.get(key)
+            if bits is not None:
+                self._range.move_to_end(key)
+                return bits
+
+        values = self._columns[column]
+        codes = self._codes.get(column)
+        if codes is not None:
+            if op != "eq":
+                raise TypeError(f"{column}: 文字列の列に {op} は使えません")
+            value = codes.get(value, NO_CODE)
+        if op == "le":
+            mask = values <= value
+        elif op == "lt":
+            mask = values < value
+        else:
+            mask = values == value
+        bits = _pack(np.asarray(mask, dtype=bool))
+
+        with self._lock:
+            added = key not in self._range
+            self._range[key] = bits
+            while len(self._range) > RANGE_CACHE_SIZE:
+                self._range.popitem(last=False)
+                added = False
+        if added and self.on_resize is not None:
+            self.on_resize()
+        return bits
+
+    def to_mask(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits.view(np.uint8), count=self.rows).view(bool)
+
+    def query(self) -> "BitmapQuery":
+        return BitmapQuery(self)
+
+
+# =========================================================
+# 条件の積み上げ（filter_dataframe_v2 から使う）
+# =========================================================
+class BitmapQuery:
+    def __init__(self, index: BitmapIndex):
+        self.index = index
+        self.bits = index.full()
+
+    def eq(self, column: str, value) -> None:
+        self.bits = self.bits & self.index.eq(column, value)
+
+    def le(self, column: str, value) -> None:
+        self.bits = self.bits & self.index.le(column, value)
+
+    def ge(self, column: str, value) -> None:
+        self.bits = self.bits & self.index.ge(column, value)
+
+    def between(self, column: str, low, high) -> None:
+        self.bits = self.bits & self.index.between(column, low, high)
+
+    def mask(self) -> np.ndarray:
+        return self.index.to_mask(self.bits)
+
+
+class ScanQuery:
+    """
+    索引なしのフォールバック（列を毎回走査する）
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._mask = pd.Series(True, index=df.index)
+
+    def eq(self, column: str, value) -> None:
+        self._mask &= self.df[column].eq(value)
+
+    def le(self, column: str, value) -> None:
+        self._mask &= self.df[column].le(value)
+
+    def ge(self, column: str, value) -> None:
+        self._mask &= self.df[column].ge(value)
+
+    def between(self, column: str, low, high) -> None:
+        self._mask &= self.df[column].between(low, high)
+
+    def mask(self) -> pd.Series:
+        return self._mask
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from datastore.cube import AGG_COLUMNS, Aggregate
+from datastore.index import BitmapIndex
+
+# データは 当該REGゲーム数 昇順で保持する（打ち出しG数のしきい値が連続区間になる）
+SORT_COLUMN = "当該REGゲーム数"
+
+# 累積和を持つ基本条件（朝イチ × スルー回数）
+GROUP_COLUMNS = ("朝イチ", "スルー回数")
+
+
+def sort_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if SORT_COLUMN not in df.columns or is_sorted(df):
+        return df
+    return df.sort_values(SORT_COLUMN, kind="stable").reset_index(drop=True)
+
+
+def is_sorted(df: pd.DataFrame) -> bool:
+    if SORT_COLUMN not in df.columns:
+        return False
+    values = df[SORT_COLUMN].to_numpy()
+    return bool(np.all(values[1:] >= values[:-1]))
+
+
+def _cumsum(values: np.ndarray) -> np.ndarray:
+    out = np.zeros((len(values) + 1, values.shape[1]), dtype=np.float64)
+    np.cumsum(values, axis=0, out=out[1:])
+    return out
+
+
+# =========================================================
+# 朝イチ×スルー回数ごとの累積和
+# =========================================================
+class PrefixSums:
+    """
+    グループ内の行は 当該REGゲーム数 昇順なので、
+    「しきい値以上」の件数・合計は searchsorted + 差分で求まる。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        games = df[SORT_COLUMN].to_numpy()
+        values = np.stack([df[c].to_numpy().astype(np.float64) for c in AGG_COLUMNS], axis=1)
+        keys = np.stack([df[c].to_numpy().astype(np.int64) for c in GROUP_COLUMNS], axis=1)
+
+        self.groups: Dict[Tuple[int, ...], Tuple[np.ndarray, np.ndarray]] = {}
+        if not len(df):
+            return
+        uniques, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(uniques) + 1))
+        for i, key in enumerate(uniques):
+            rows = order[bounds[i]:bounds[i + 1]]
+            self.groups[tuple(int(k) for k in key)] = (games[rows], _cumsum(values[rows]))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(g.nbytes + c.nbytes for g, c in self.groups.values())
+
+    def suffix(self, threshold: int, where: Dict[str, int]) -> Aggregate:
+        count = 0
+        sums = np.zeros(len(AGG_COLUMNS))
+        for key, (games, cum) in self.groups.items():
+            if any(key[GROUP_COLUMNS.index(c)] != v for c, v in where.items()):
+                continue
+            start = int(np.searchsorted(games, threshold, side="left"))
+            count += len(games) - start
+            sums += cum[-1] - cum[start]
+        return Aggregate(count, sums)
+
+
+# =========================================================
+# しきい値で区間を絞ってから集計するクエリ
+# =========================================================
+class SortedQuery:
+    """
+    QueryPlan と同じ条件を受け取り、DataFrameを作らずに集計する。
+
+    - SORT_COLUMN の ge は searchsorted で開始位置に変換
+    - 残りが朝イチ・スルー回数の一致だけなら PrefixSums で O(グループ数)
+    - それ以外はビットマップを開始位置以降だけ AND して集計
+    """
+
+    def __init__(self, frame: pd.DataFrame, index: BitmapIndex, prefix: Optional[PrefixSums]):
+        self.frame = frame
+        self.index = index
+        self.prefix = prefix
+        self.preds: List[Tuple] = []
+        self.threshold: Optional[int] = None
+
+    def eq(self, column: str, value) -> None:
+        self.preds.append(("eq", column, value))
+
+    def between(self, column: str, low, high) -> None:
+        self.preds.append(("between", column, low, high))
+
+    def le(self, column: str, value) -> None:
+        self.preds.append(("le", column, value))
+
+    def ge(self, column: str, value) -> None:
+        if column == SORT_COLUMN and self.prefix is not None:
+            self.threshold = value if self.threshold is None else max(self.threshold, value)
+        else:
+            self.preds.append(("ge", column, value))
+
+    def _base_where(self) -> Optional[Dict[str, int]]:
+        where: Dict[str, int] = {}
+        for pred in self.preds:
+            if pred[0] != "eq" or pred[1] not in GROUP_COLUMNS or pred[1] in where:
+                return None
+            try:
+                where[pred[1]] = int(pred[2])
+            except (TypeError, ValueError):
+                return None
+        return where
+
+    def _selected(self) -> Tuple[int, np.ndarray]:
+        """
+        (開始位置, 開始位置以降の一致マスク)
+        """
+        threshold = self.threshold
+        if threshold is not None:
+            start = int(np.searchsorted(self.frame[SORT_COLUMN].to_numpy(), threshold, side="left"))
+        else:
+            start = 0
+
+        rows = self.index.rows
+        word = start // 64
+        bits = self.index.full()[word:]
+        for pred in self.preds:
+            op, column = pred[0], pred[1]
+            # eq / le / ge / between
+            bits = bits & getattr(self.index, op)(column, *pred[2:])[word:]
+
+        mask = np.unpackbits(bits.view(np.uint8), count=rows - word * 64).view(bool)
+        return start, mask[start - word * 64:]
+
+    def aggregate(self) -> Aggregate:
+        if self.threshold is not None:
+            where = self._base_where()
+            if where is not None:
+                return self.prefix.suffix(self.threshold, where)
+
+        start, mask = self._selected()
+        count = int(np.count_nonzero(mask))
+        sums = np.array([
+            self.frame[c].to_numpy()[start:][mask].sum(dtype=np.float64) for c in AGG_COLUMNS
+        ])
+        return Aggregate(count, sums)
+
+    def sweep(self, thresholds: Sequence[int]) -> List[Aggregate]:
+        """
+        しきい値ごとの集計をまとめて返す（マスクは1回だけ作る）。
+
+        一致行を 当該REGゲーム数 順に並べて累積和を取り、
+        各しきい値の開始位置を searchsorted で引いて差分を取る。
+        """
+        edges = np.asarray(thresholds, dtype=np.int64)
+        if self.threshold is not None:
+            edges = np.maximum(edges, self.threshold)
+
+        where = self._base_where() if self.prefix is not None else None
+        if where is not None:
+            counts = np.zeros(len(edges), dtype=np.int64)
+            sums = np.zeros((len(edges), len(AGG_COLUMNS)))
+            for key, (games, cum) in self.prefix.groups.items():
+                if any(key[GROUP_COLUMNS.index(c)] != v for c, v in where.items()):
+                    continue
+                starts = np.searchsorted(games, edges, side="left")
+                counts += len(games) - starts
+                sums += cum[-1] - cum[starts]
+        else:
+            start, mask = self._selected()
+            games = self.frame[SORT_COLUMN].to_numpy()[start:][mask]
+            values = np.stack([
+                self.frame[c].to_numpy()[start:][mask].astype(np.float64) for c in AGG_COLUMNS
+            ], axis=1)
+            if self.prefix is None:
+                order = np.argsort(games, kind="stable")
+                games, values = games[order], values[order]
+            cum = _cumsum(values)
+            starts = np.searchsorted(games, edges, side="left")
+            counts = len(games) - starts
+            sums = cum[-1] - cum[starts]
+
+        return [Aggregate(c, s) for c, s in zip(counts, sums)]
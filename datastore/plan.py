@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+from typing import Iterable, Optional, Tuple
+
+from datastore.cube import Aggregate
+from datastore.layout import SORT_COLUMN
+
+# 述語: ("eq"|"le"|"ge", 列, 値) / ("between", 列, 下限, 上限)
+Predicate = Tuple
+
+
+# =========================================================
+# コンパイル済みの検索条件（machine_page / all_tool 共通）
+# =========================================================
+class QueryPlan:
+    """
+    フォームを解釈した結果の述語列と、当該REGゲーム数のしきい値。
+
+    フォームの解釈（ラベル・ロック項目・「不問」）はコンパイル時に済ませ、
+    実行時は ScanQuery / BitmapQuery / SortedQuery に積むだけにする。
+    同じ条件なら書き方が違っても key は同じになる（クエリ結果キャッシュのキー）。
+    """
+
+    __slots__ = ("preds", "threshold", "key")
+
+    def __init__(self, preds: Iterable[Predicate], threshold: Optional[int] = None):
+        self.preds = tuple(dict.fromkeys(tuple(p) for p in preds))
+        self.threshold = threshold
+        self.key = json.dumps(
+            [sorted(json.dumps(p, ensure_ascii=False) for p in self.preds), threshold],
+            ensure_ascii=False,
+        )
+
+    def apply(self, q) -> None:
+        for op, column, *args in self.preds:
+            getattr(q, op)(column, *args)
+        if self.threshold is not None:
+            q.ge(SORT_COLUMN, self.threshold)
+
+    def aggregate(self, dataset) -> Aggregate:
+        q = dataset.sorted_query()
+        self.apply(q)
+        return q.aggregate()
+
+    def sweep(self, dataset, thresholds: Iterable[int]):
+        q = dataset.sorted_query()
+        self.apply(q)
+        return q.sweep(list(thresholds))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, QueryPlan) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"QueryPlan({list(self.preds)!r}, threshold={self.threshold!r})"
+
+
+class PlanBuilder:
+    """
+    q の代わりに apply_filters_v2 などへ渡し、積まれた条件から QueryPlan を作る
+    """
+
+    def __init__(self):
+        self.preds = []
+        self.threshold: Optional[int] = None
+
+    def eq(self, column: str, value) -> None:
+        self.preds.append(("eq", column, value))
+
+    def le(self, column: str, value) -> None:
+        self.preds.append(("le", column, value))
+
+    def between(self, column: str, low, high) -> None:
+        self.preds.append(("between", column, low, high))
+
+    def ge(self, column: str, value) -> None:
+        if column == SORT_COLUMN:
+            self.threshold = value if self.threshold is None else max(self.threshold, value)
+        else:
+            self.preds.append(("ge", column, value))
+
+    def build(self) -> QueryPlan:
+        return QueryPlan(self.preds, self.threshold)
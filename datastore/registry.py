@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+from datastore.cache import DatasetCache
+from datastore.columnar import read_table, source_mtime
+from datastore.dataset import Dataset
+
+
+# =========================================================
+# CSVパス → 現行の Dataset（データ差し替えの監視つき）
+# =========================================================
+class DatasetRegistry:
+    """
+    リクエスト中は cache を引くだけで stat() しない。
+
+    裏のスレッドが interval 秒ごとに読み込み済みのパスの source_mtime を確認し、
+    変わっていれば新しい版（索引・キューブ込み）を作ってから cache を差し替える。
+    - 書き込み途中のファイルを読まないよう、同じ版を2回続けて見てから読む
+    - 読み込みに失敗した版は旧版のまま使い続け、同じ版は再試行しない
+    """
+
+    def __init__(self, cache: DatasetCache, interval: float = 5.0):
+        self.cache = cache
+        self.interval = interval
+        self._watched: Dict[str, Optional[dict]] = {}  # パス → dtypes
+        self._pending: Dict[str, float] = {}           # パス → 前回見た新しい版
+        self._failed: Dict[str, float] = {}            # パス → 読み込みに失敗した版
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.generation = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def get(self, path: str, dtypes: Optional[dict] = None) -> Dataset:
+        dataset = self.cache.get(path)
+        if dataset is not None:
+            return dataset
+        return self.load(path, dtypes)
+
+    def load(self, path: str, dtypes: Optional[dict] = None) -> Dataset:
+        """
+        初回・LRUで捨てられた後の読み込み（版は読む前に取る。読んでいる間の更新は次の確認で拾う）
+        """
+        version = source_mtime(path)
+        dataset = Dataset(read_table(path, dtypes=dtypes), version=version)
+        self.cache.put(path, version, dataset)
+        with self._lock:
+            self._watched[path] = dtypes
+        return dataset
+
+    # =========================
+    # 変更の確認と差し替え
+    # =========================
+    def poll(self) -> int:
+        """
+        1回分の確認。差し替えた件数を返す
+        """
+        with self._lock:
+            watched = dict(self._watched)
+
+        swapped = 0
+        for path, dtypes in watched.items():
+            current = self.cache.peek(path)
+            if current is None:
+                # LRUで捨てられた。次に使われたときに最新を読む
+                with self._lock:
+                    self._watched.pop(path, None)
+                self._pending.pop(path, None)
+                continue
+
+            try:
+                version = source_mtime(path)
+            except OSError:
+                continue  # 置き換え途中
+            if version == current.version or version == self._failed.get(path):
+                self._pending.pop(path, None)
+                continue
+            if self._pending.get(path) != version:
+                self._pending[path] = version
+                continue
+
+            try:
+                dataset = Dataset(read_table(path, dtypes=dtypes), version=version)
+                dataset.prepare_like(current)
+            except Exception as e:
+                self._failed[path] = version
+                self.failures += 1
+                self.last_error = f"{path}: {e}"
+                print(f"[datasets] reload failed, keeping previous version: {self.last_error}", file=sys.stderr)
+                continue
+
+            self.cache.put(path, version, dataset)
+            self._pending.pop(path, None)
+            self._failed.pop(path, None)
+            with self._lock:
+                self.generation += 1
+                self.reloads += 1
+            swapped += 1
+        return swapped
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.last_error = f"poll: {e}"
+                print(f"[datasets] {self.last_error}", file=sys.stderr)
+
+    def start(self) -> None:
+        """
+        監視スレッドを起動する（fork 後の worker で呼ぶ。interval<=0 なら何もしない）
+        """
+        if self.interval <= 0:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="dataset-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "watched": len(self._watched),
+                "generation": self.generation,
+                "reloads": self.reloads,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "interval": self.interval,
+                "running": self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            }
@@ -0,0 +1,45 @@
+"""
+本番用 gunicorn 設定（render.yaml の startCommand: gunicorn app:app）
+
+preload_app で master が app を import し、when_ready でデータ・索引・キューブを
+DATA_CACHE の上限まで作ってから worker を fork する。numpy の配列や索引は
+copy-on-write で全 worker に共有され、読み込み済みの機種は最初のリクエストで読み込みが走らない。
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+def when_ready(server):
+    # preload_app 済みなので import し直しにはならない
+    from app import warm_up
+
+    state = warm_up()
+    for entry in state["machines"]:
+        server.log.info(
+            "warm-up %s/%s: %d files, %d rows, %d skipped (cache full), %.2fs",
+            entry["tool"], entry["machine"], entry["files"], entry["rows"], entry["skipped"], entry["seconds"],
+        )
+        for error in entry["errors"]:
+            server.log.warning("warm-up %s/%s: %s", entry["tool"], entry["machine"], error)
+    server.log.info("warm-up done in %.2fs (%d machines)", state["seconds"], len(state["machines"]))
+
+    # fork 後に GC が共有ページの参照カウント領域へ書き込まないよう、ここまでの生成物を固定
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # preload_app を切った場合は worker ごとにウォームアップ（済んでいれば何もしない）
+    from app import DATASETS, WARM_UP_STATE, warm_previews, warm_up
+
+    if not WARM_UP_STATE["ready"]:
+        warm_up()
+
+    # スレッドは fork で引き継がれないので、データ差し替えの監視・プレビュー取得は worker ごとに起動
+    DATASETS.start()
+    warm_previews()
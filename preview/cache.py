@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from preview.store import PreviewStore
+
+# 成功したプレビューの有効期間 / 失敗（ネガティブキャッシュ）の有効期間
+PREVIEW_TTL = 60 * 60
+PREVIEW_ERROR_TTL = 5 * 60
+
+
+# =========================================================
+# OGPプレビューの非同期キャッシュ
+# =========================================================
+class PreviewCache:
+    """
+    url → メタ情報（fetch の戻り値）。
+
+    - get() はネットワークを待たない（無い・古い場合は裏で取得を予約するだけ）
+    - エントリごとにTTL。期限切れでも取り直しが終わるまでは古い値を返す
+    - fetch が例外を出した場合だけ、短いTTLで「失敗」を覚えておく
+    - store（PreviewStore）があれば、裏の取得の前にそちらを見て、取得結果も書き込む
+      （get() は SQLite を待たない。起動時の warm() で既知のURLは手元に入れておく）
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Dict[str, Any]],
+        ttl: float = PREVIEW_TTL,
+        error_ttl: float = PREVIEW_ERROR_TTL,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.time,
+        store: Optional[PreviewStore] = None,
+    ):
+        self.fetch = fetch
+        self.store = store
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_workers = max_workers
+        self.clock = clock
+        # url → (値 or None, 期限, 成功したか)
+        self._entries: Dict[str, Tuple[Optional[Dict[str, Any]], float, bool]] = {}
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.failures = 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        手元にある値（古くても返す）。無い・失敗中なら None
+        """
+        now = self.clock()
+        # ストア（SQLite）はリクエスト中に見ない。無い・古いときは裏の取得がまずストアを見る
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+            elif entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            else:
+                self.stale_hits += 1
+        self.refresh(url)
+        return entry[0] if entry is not None else None
+
+    def set(self, url: str, value: Optional[Dict[str, Any]], expires: float, ok: bool = True) -> None:
+        with self._lock:
+            self._entries[url] = (value, expires, ok)
+
+    def refresh(self, url: str) -> Optional[Future]:
+        """
+        裏で取り直す（同じURLの取得が走っていれば何もしない）
+        """
+        # 先にプールを確認する（fork 直後なら親から引き継いだ _pending はここで捨てる）
+        pool = self._pool()
+        with self._lock:
+            if url in self._pending:
+                return None
+            self._pending.add(url)
+        return pool.submit(self._run, url)
+
+    def warm(self, urls: Iterable[str], block: bool = False) -> int:
+        """
+        手元にもストアにも新しい値が無いURLだけ取得を予約する（block=True で完了まで待つ）
+        """
+        now = self.clock()
+        futures: List[Future] = []
+        for url in dict.fromkeys(urls):
+            with self._lock:
+                entry = self._entries.get(url)
+            if entry is None and self.store is not None:
+                entry = self.store.get(url)
+                if entry is not None:
+                    self.set(url, *entry)
+            if entry is not None and entry[1] > now:
+                continue
+            future = self.refresh(url)
+            if future is not None:
+                futures.append(future)
+        if block:
+            wait(futures)
+        return len(futures)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # gunicorn の preload で fork された場合、親のスレッドは引き継がれないので作り直す
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="preview"
+                )
+                self._pid = os.getpid()
+                self._pending.clear()
+            return self._executor
+
+    def _load_stored(self, url: str) -> bool:
+        """
+        他のworker・前回のデプロイが取得済みの新しい値があれば手元に入れる（取得は不要）
+        """
+        stored = self.store.get(url)
+        if stored is None or stored[1] <= self.clock():
+            return False
+        with self._lock:
+            old = self._entries.get(url)
+            if old is None or stored[1] > old[1]:
+                self._entries[url] = stored
+        return True
+
+    def _run(self, url: str) -> None:
+        try:
+            loaded = self.store is not None and self._load_stored(url)
+        except Exception:
+            loaded = False
+        if loaded:
+            with self._lock:
+                self._pending.discard(url)
+            return
+
+        try:
+            value = self.fetch(url)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                old = self._entries.get(url)
+                if old is not None and old[2]:
+                    # 取得済みの値は残し、次の再試行まで期限だけ延ばす
+                    entry = (old[0], self.clock() + self.error_ttl, True)
+                else:
+                    entry = (None, self.clock() + self.error_ttl, False)
+                self._entries[url] = entry
+        else:
+            with self._lock:
+                self.fetches += 1
+                entry = (value, self.clock() + self.ttl, True)
+                self._entries[url] = entry
+        finally:
+            with self._lock:
+                self._pending.discard(url)
+
+        if self.store is not None:
+            self.store.put(url, *entry, fetched_at=self.clock())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "failures": self.failures,
+            }
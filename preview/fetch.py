@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, Optional
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+# note.com などへの接続はプール付きセッションで使い回す
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=8))
+SESSION.headers["User-Agent"] = "Mozilla/5.0"
+
+
+def is_memo_link(url: str) -> bool:
+    # ★ memo系は固定表示（スクレイピングしない）
+    return "127.0.0.1" in url or "/memo/" in url
+
+
+def is_http_link(url: str) -> bool:
+    # /okidoki/tools のようなサイト内リンクは取得しない
+    return url.startswith(("http://", "https://"))
+
+
+# <head> を読み切る前でもここで打ち切る（巨大ページ対策）
+MAX_HEAD_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024
+# </head> 以降の本文はこの量までなら読み捨てて接続をプールへ戻す。
+# 超える分は読まずに切断する（その接続の使い回しは諦める）
+MAX_DRAIN_BYTES = 64 * 1024
+
+
+class HeadMeta:
+    """
+    <head> 内の <meta> / <title> だけを集める（最初に出てきたものを優先）
+    """
+
+    def __init__(self):
+        self.by_property: Dict[str, dict] = {}
+        self.by_name: Dict[str, dict] = {}
+        self.title: Optional[str] = None
+
+    def add_meta(self, attrs: dict) -> None:
+        if "property" in attrs:
+            self.by_property.setdefault(attrs["property"], attrs)
+        if "name" in attrs:
+            self.by_name.setdefault(attrs["name"], attrs)
+
+    def pick(self, *names: str) -> Optional[str]:
+        for n in names:
+            el = self.by_property.get(n) or self.by_name.get(n)
+            if el and el.get("content"):
+                return el["content"].strip()
+        return None
+
+
+def read_head_meta(chunks: Iterable[bytes], encoding: Optional[str] = None, max_bytes: int = MAX_HEAD_BYTES) -> HeadMeta:
+    """
+    HTMLをチャンクごとにlxmlへ流し、</head>（または<body>）か max_bytes で読むのをやめる
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+    head = HeadMeta()
+    total = 0
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        chunk = chunk[:max_bytes - total]
+        total += len(chunk)
+        parser.feed(chunk)
+
+        for event, el in parser.read_events():
+            tag = el.tag if isinstance(el.tag, str) else ""
+            if event == "start" and tag == "meta":
+                head.add_meta(dict(el.attrib))
+            elif event == "end" and tag == "title" and head.title is None:
+                head.title = el.text.strip() if el.text and el.text.strip() else None
+            elif (event == "end" and tag == "head") or (event == "start" and tag == "body"):
+                return head
+
+        if total >= max_bytes:
+            break
+
+    return head
+
+
+def drain_body(resp: requests.Response, chunks: Iterator[bytes], max_bytes: int = MAX_DRAIN_BYTES) -> bool:
+    """
+    残りの本文を max_bytes まで読み捨てる。読み切れたら True（close() で接続がプールへ戻る）
+    """
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) - resp.raw.tell() > max_bytes:
+        return False
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > max_bytes:
+            return False
+    return True
+
+
+def fetch_link_meta(url: str, timeout: int = 6) -> Dict[str, Optional[str]]:
+    """
+    ページのOGP/Twitterメタ → dict（取得失敗は例外）
+    """
+    with SESSION.get(url, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        # Content-Type に charset があればそれを使い、無ければ <meta charset> に任せる
+        encoding = resp.encoding if "charset" in resp.headers.get("Content-Type", "").lower() else None
+        chunks = resp.iter_content(CHUNK_SIZE)
+        head = read_head_meta(chunks, encoding=encoding)
+        drain_body(resp, chunks)
+
+    title = head.pick("og:title", "twitter:title") or head.title
+
+    desc  = head.pick("og:description", "twitter:description", "description")
+    image = head.pick("og:image", "twitter:image")
+    site  = head.pick("og:site_name", "twitter:site")
+
+    if image and image.startswith("//"):
+        image = "https:" + image
+
+    return {
+        "title": title,
+        "description": desc or "",
+        "image": image,
+        "site_name": site or ""
+    }
@@ -0,0 +1,54 @@
+"""
+new_config のリンク（機種ごとの links + COMMON_LINKS）のプレビューを並列取得してストアへ保存する
+
+    python -m preview.prewarm [store_path]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+from typing import Any, List
+
+from config.compiled import load_config
+from preview.cache import PreviewCache
+from preview.fetch import fetch_link_meta, is_http_link, is_memo_link
+from preview.store import DEFAULT_STORE_PATH, PreviewStore
+
+
+def collect_urls(new_config: Any = None) -> List[str]:
+    if new_config is None:
+        new_config = load_config("new_config")
+    links = list(getattr(new_config, "COMMON_LINKS", []) or [])
+    table = new_config.machine_configs
+    # 機種ごとの遅延展開を崩さないよう、展開済みの表には入れずに読む
+    for key in table:
+        links += table.peek(key).get("links") or []
+    urls = [item.get("link_url") for item in links]
+    return list(dict.fromkeys(u for u in urls if u and is_http_link(u) and not is_memo_link(u)))
+
+
+def prewarm(store_path: str = DEFAULT_STORE_PATH, max_workers: int = 8) -> int:
+    store = PreviewStore(store_path)
+    cache = PreviewCache(fetch=fetch_link_meta, store=store, max_workers=max_workers)
+
+    urls = collect_urls()
+    started = time.perf_counter()
+    fetched = cache.warm(urls, block=True)
+
+    failed = 0
+    for url in urls:
+        entry = store.get(url)
+        if entry is None or not entry[2]:
+            failed += 1
+            print(f"[NG] {url}", file=sys.stderr)
+    print(
+        f"[OK] {len(urls) - failed}/{len(urls)} previews "
+        f"({fetched} fetched, {time.perf_counter() - started:.2f}s) -> {store_path}"
+    )
+    return failed
+
+
+if __name__ == "__main__":
+    # 取得失敗はデプロイを止めない（実行時に裏で再取得される）
+    prewarm(*sys.argv[1:2], max_workers=int(os.environ.get("PREVIEW_PREWARM_WORKERS", "8")))
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 既定の保存先（環境変数 PREVIEW_DB で変更）
+DEFAULT_STORE_PATH = os.path.join("data", "previews.sqlite3")
+
+# (メタ情報 or None, 期限UNIX時刻, 成功したか)
+Entry = Tuple[Optional[Dict[str, Any]], float, bool]
+
+
+# =========================================================
+# プレビューの永続ストア（SQLite・worker/デプロイ間で共有）
+# =========================================================
+class PreviewStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS previews ("
+            " url TEXT PRIMARY KEY, meta TEXT, expires REAL NOT NULL,"
+            " ok INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        conn = sqlite3.connect(self.path, timeout=1.0)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get(self, url: str) -> Optional[Entry]:
+        try:
+            rows = self._execute("SELECT meta, expires, ok FROM previews WHERE url = ?", (url,))
+        except sqlite3.Error:
+            return None
+        if not rows:
+            return None
+        meta, expires, ok = rows[0]
+        return (json.loads(meta) if meta else None), expires, bool(ok)
+
+    def put(self, url: str, meta: Optional[Dict[str, Any]], expires: float, ok: bool, fetched_at: float) -> None:
+        try:
+            self._execute(
+                "INSERT OR REPLACE INTO previews (url, meta, expires, ok, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (url, json.dumps(meta, ensure_ascii=False) if meta else None, expires, int(ok), fetched_at),
+            )
+        except sqlite3.Error:
+            pass
+
+    def items(self) -> Iterator[Tuple[str, Entry]]:
+        for url, meta, expires, ok in self._execute("SELECT url, meta, expires, ok FROM previews"):
+            yield url, ((json.loads(meta) if meta else None), expires, bool(ok))
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# リポジトリ直下のパッケージ（datastore / config / auth / preview）を import できるように
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app を import するテスト用（プレビュー取得・データ監視スレッドを起動しない、実ファイルに書かない）
+os.environ.setdefault("PREVIEW_PREWARM", "0")
+os.environ.setdefault("DATA_RELOAD_INTERVAL", "0")
+os.environ.setdefault("RATE_LIMIT_DB", os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3"))
+# 本番（render.yaml）と同じくプロキシ1段の後ろにいる想定
+os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")
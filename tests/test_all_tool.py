@@ -0,0 +1,72 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app as slot_app
+from datastore.columnar import ALL_DTYPES
+
+
+@pytest.fixture
+def client():
+    client = slot_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["all_access"] = True
+    return client
+
+
+def test_unknown_machine_renders_error_page(client):
+    resp = client.post("/all", data={"machine": "nope"})
+    assert resp.status_code == 200
+    assert "機種が未選択です" in resp.get_data(as_text=True)
+
+
+def test_csv_error_renders_error_page(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError("broken")
+
+    monkeypatch.setattr(slot_app, "load_dataset", broken)
+    machine = next(iter(slot_app.ALL_VIEWS))
+    resp = client.post("/all", data={"machine": machine})
+    assert resp.status_code == 200
+    assert "CSV読み込みエラー: broken" in resp.get_data(as_text=True)
+
+
+def test_rejected_machine_renders_error_page(client, monkeypatch):
+    # normalize_settings が弾いた機種（ALL_VIEWS に無い）は既定値で計算せずエラーにする
+    machine = next(iter(slot_app.ALL_VIEWS))
+    views = {k: v for k, v in slot_app.ALL_VIEWS.items() if k != machine}
+    monkeypatch.setattr(slot_app, "ALL_VIEWS", views)
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("CSV should not be loaded")
+
+    monkeypatch.setattr(slot_app, "load_dataset", unexpected)
+    resp = client.post("/all", data={"machine": machine})
+    assert resp.status_code == 200
+    assert "機種の設定に誤りがあるため表示できません" in resp.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("values", [
+    {"time": "朝イチ以外", "through": "1"},
+    {"time": "朝イチ以外", "at_gap": "100"},   # AT間G数は打ち出しG数ごとに集計し直す
+])
+def test_api_sweep_matches_single_queries(client, values):
+    machine = "lotis"
+    resp = client.post("/api/sweep", data=dict(values, machine=machine))
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+
+    view = slot_app.ALL_VIEWS[machine]
+    settings = view["settings"]
+    selected = slot_app.parse_all_form(MultiDict(values), view)
+    file_key = slot_app.new_config.machine_configs[machine]["file_key"]
+    suffix = slot_app.mode_to_csv_suffix(selected["mode"]) or "rb"
+    dataset = slot_app.load_dataset(f"data/{file_key}/{suffix}.csv", dtypes=ALL_DTYPES)
+
+    assert [row["game"] for row in results] == list(view["game_options"])
+    for row in results:
+        form = slot_app.build_filter_form(dict(selected, game=row["game"]))
+        assert row["count"] == slot_app.aggregate_v2(dataset, machine, form, settings).count
+
+
+def test_api_sweep_rejects_unknown_machine(client):
+    assert client.post("/api/sweep", data={"machine": "nope"}).status_code == 400
@@ -0,0 +1,32 @@
+import json
+import os
+
+import pandas as pd
+
+from datastore.build import build_all, manifest_path
+from datastore.columnar import ALL_DTYPES, LEGACY_DTYPES, dtypes_for
+
+
+def write_csv(path, dtypes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame([{name: 1 for name in dtypes}] * 3).to_csv(path, index=False)
+
+
+def test_dtypes_for_uses_depth_below_data_dir(tmp_path):
+    data_dir = tmp_path / "dd"
+    assert dtypes_for(str(data_dir / "hokuto_at.csv"), str(data_dir)) is LEGACY_DTYPES
+    assert dtypes_for(str(data_dir / "hokuto" / "at.csv"), str(data_dir)) is ALL_DTYPES
+    # data_dir の中に data という名前のディレクトリがあっても深さで判定する
+    assert dtypes_for(str(data_dir / "data" / "at.csv"), str(data_dir)) is ALL_DTYPES
+
+
+def test_build_from_directory_not_named_data(tmp_path):
+    data_dir = tmp_path / "rv" / "dd"
+    write_csv(str(data_dir / "hokuto_at.csv"), LEGACY_DTYPES)
+    write_csv(str(data_dir / "hokuto" / "at.csv"), ALL_DTYPES)
+
+    assert build_all(str(data_dir), workers=1) == 0
+    with open(manifest_path(str(data_dir)), encoding="utf-8") as f:
+        files = json.load(f)["files"]
+    assert files["hokuto_at.csv"]["columns"] == list(LEGACY_DTYPES)
+    assert files[os.path.join("hokuto", "at.csv")]["columns"] == list(ALL_DTYPES)
@@ -0,0 +1,138 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import app as slot_app
+from datastore.cache import DatasetCache, ResultCache, SharedResultStore
+from datastore.cube import ResultCube
+from datastore.dataset import Dataset
+from datastore.plan import QueryPlan
+
+
+def make_frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "当該REGゲーム数": np.sort(rng.integers(0, 1000, n)).astype(np.int32),
+        "朝イチ": rng.integers(0, 2, n).astype(np.int8),
+        "スルー回数": rng.integers(0, 5, n).astype(np.int16),
+        "前回連荘数": rng.integers(1, 4, n).astype(np.int16),
+        "前回種別": pd.Categorical(rng.choice(["下位", "上位"], n)),
+        "AT間ゲーム数": rng.integers(0, 2000, n).astype(np.int32),
+        "REGゲーム数": rng.random(n).astype(np.float32),
+        "ATゲーム数": rng.random(n).astype(np.float32),
+        "REG枚数": rng.random(n).astype(np.float32),
+        "AT枚数": rng.random(n).astype(np.float32),
+    })
+
+
+def build_cube(df):
+    return ResultCube(df, exclude_games=0, game_options=range(0, 1000, 50), range_defaults={})
+
+
+def test_default_sizeof_accepts_dataset():
+    cache = DatasetCache(1 << 30)
+    dataset = Dataset(make_frame())
+    cache.put("a.csv", 1.0, dataset)
+    assert cache.get("a.csv") is dataset
+    assert cache.total_bytes == dataset.nbytes
+
+
+def test_derived_structures_update_size():
+    cache = DatasetCache(1 << 30)
+    dataset = Dataset(make_frame())
+    cache.put("a.csv", 1.0, dataset)
+    before = cache.total_bytes
+
+    dataset.cube("m", build_cube)
+    after_cube = cache.total_bytes
+    assert after_cube > before
+
+    dataset.index.le("AT間ゲーム数", 500)
+    assert cache.total_bytes > after_cube
+    assert cache.total_bytes == dataset.nbytes
+
+
+def test_growth_evicts_to_stay_within_budget():
+    first, second = Dataset(make_frame(seed=1)), Dataset(make_frame(seed=2))
+    cache = DatasetCache(first.nbytes + second.nbytes + 1)
+    cache.put("a.csv", 1.0, first)
+    cache.put("b.csv", 1.0, second)
+    assert len(cache) == 2
+
+    second.cube("m", build_cube)
+    assert cache.total_bytes <= cache.max_bytes
+    assert "a.csv" not in cache and "b.csv" in cache
+
+
+def test_replaced_value_does_not_resize():
+    cache = DatasetCache(1 << 30)
+    old, new = Dataset(make_frame(seed=1)), Dataset(make_frame(seed=2))
+    cache.put("a.csv", 1.0, old)
+    cache.put("a.csv", 2.0, new)
+    old.cube("m", build_cube)
+    assert cache.total_bytes == new.nbytes
+
+
+# =========================
+# クエリ結果キャッシュ
+# =========================
+def test_query_key_is_normalized():
+    a = QueryPlan([("eq", "朝イチ", 0), ("between", "前回差枚数", -100, 100), ("eq", "朝イチ", 0)], 40)
+    b = QueryPlan([("between", "前回差枚数", -100, 100), ("eq", "朝イチ", 0)], 40)
+    dataset = Dataset(make_frame(10), version=1.0)
+    assert slot_app.query_cache_key("data/x/at.csv", dataset, a) == slot_app.query_cache_key("data/x/at.csv", dataset, b)
+
+    # データの版・しきい値・ファイルが違えば別のキー
+    newer = Dataset(make_frame(10), version=2.0)
+    keys = {
+        slot_app.query_cache_key("data/x/at.csv", dataset, a),
+        slot_app.query_cache_key("data/x/at.csv", newer, a),
+        slot_app.query_cache_key("data/x/at.csv", dataset, QueryPlan(a.preds, 50)),
+        slot_app.query_cache_key("data/x/rb.csv", dataset, a),
+    }
+    assert len(keys) == 4
+
+
+def test_result_cache_ttl():
+    now = [100.0]
+    cache = ResultCache(max_entries=10, ttl=60, clock=lambda: now[0])
+    cache.put("k", [1, [2.0]])
+    now[0] += 59
+    assert cache.get("k") == [1, [2.0]]
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+    assert len(cache) == 0
+
+
+def test_result_cache_lru_bound():
+    cache = ResultCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # a を最近使ったことにする
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_store_hit_from_second_cache(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    first = ResultCache(max_entries=10, ttl=60, shared=SharedResultStore(path))
+    second = ResultCache(max_entries=10, ttl=60, shared=SharedResultStore(path))
+
+    first.put("k", [3, [1.5, 2.5]])
+    assert second.get("k") == [3, [1.5, 2.5]]
+    assert second.stats()["shared_hits"] == 1
+    # 2回目からはプロセス内で当たる
+    assert second.get("k") == [3, [1.5, 2.5]]
+    assert second.stats()["hits"] == 1
+
+
+def test_shared_store_expires(tmp_path):
+    store = SharedResultStore(str(tmp_path / "results.sqlite3"))
+    store.put("k", 1, ttl=0.05)
+    assert store.get("k")[0] == 1
+    time.sleep(0.1)
+    assert store.get("k") is None
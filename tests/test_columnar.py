@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore.columnar import ALL_DTYPES, read_csv_chunked
+
+HEADER = list(ALL_DTYPES) + ["前回種別", "機種別条件"]
+
+
+def write_csv(path, types, conditions=None):
+    rows = []
+    for i, prev_type in enumerate(types):
+        row = {name: i for name in ALL_DTYPES}
+        row["前回種別"] = prev_type
+        row["機種別条件"] = conditions[i] if conditions else i % 3
+        rows.append(row)
+    pd.DataFrame(rows, columns=HEADER).to_csv(path, index=False)
+    return str(path)
+
+
+def as_strings(series):
+    return [None if pd.isna(v) else str(v) for v in series]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+def test_leading_blank_text_column(tmp_path, chunksize):
+    # 先頭チャンクの 前回種別 が空欄だけ → pandas は数値（NaN）と推定する
+    types = [None, None, None, "下位", "上位", None, "下位"]
+    path = write_csv(tmp_path / "at.csv", types)
+
+    df = read_csv_chunked(path, ALL_DTYPES, chunksize=chunksize)
+    expected = pd.read_csv(path, dtype=ALL_DTYPES)
+
+    assert isinstance(df["前回種別"].dtype, pd.CategoricalDtype)
+    assert as_strings(df["前回種別"]) == as_strings(expected["前回種別"])
+    assert np.array_equal(df["機種別条件"].to_numpy(), expected["機種別条件"].to_numpy())
+
+
+def test_undeclared_integers_are_downcast(tmp_path):
+    path = write_csv(tmp_path / "at.csv", ["下位"] * 4, conditions=[0, 1, 300, 2])
+    df = read_csv_chunked(path, ALL_DTYPES, chunksize=2)
+    assert df["機種別条件"].dtype == np.int16
+    assert df["機種別条件"].tolist() == [0, 1, 300, 2]
+
+
+def test_text_in_declared_numeric_column_fails(tmp_path):
+    path = write_csv(tmp_path / "at.csv", ["下位"] * 4)
+    text = open(path, encoding="utf-8").read().replace("\n3,", "\nx,", 1)
+    open(path, "w", encoding="utf-8").write(text)
+    with pytest.raises(ValueError):
+        read_csv_chunked(path, ALL_DTYPES, chunksize=2)
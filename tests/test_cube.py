@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app as slot_app
+from datastore.columnar import ALL_DTYPES
+
+MACHINE = "lotis"
+
+
+@pytest.fixture(scope="module")
+def machine():
+    view = slot_app.ALL_VIEWS[MACHINE]
+    settings = view["settings"]
+    file_key = slot_app.new_config.machine_configs[MACHINE]["file_key"]
+    suffix = slot_app.mode_to_csv_suffix(view["mode_options"][0]) or "rb"
+    dataset = slot_app.load_dataset(f"data/{file_key}/{suffix}.csv", dtypes=ALL_DTYPES)
+    cube = slot_app.build_result_cube(dataset.frame, settings)
+    return view, settings, dataset, cube
+
+
+def filter_form(view, **values):
+    return slot_app.build_filter_form(slot_app.parse_all_form(MultiDict(values), view))
+
+
+def assert_same(agg, expected):
+    assert agg.count == expected.count
+    np.testing.assert_allclose(agg.sums, expected.sums)
+
+
+def test_default_form_matches_plan(machine):
+    view, settings, dataset, cube = machine
+    form = filter_form(view)
+    agg = cube.lookup(form, settings)
+    assert agg is not None
+    assert_same(agg, slot_app.compile_filter_plan(form, settings).aggregate(dataset))
+
+
+def test_grid_forms_match_plan(machine):
+    view, settings, dataset, cube = machine
+    for time_value in view["time_options"]:
+        for through in ("不問", "0", "1", "3"):
+            for game in view["game_options"][::5]:
+                form = filter_form(view, time=time_value, through=through, game=str(game))
+                agg = cube.lookup(form, settings)
+                assert agg is not None, form
+                assert_same(agg, slot_app.compile_filter_plan(form, settings).aggregate(dataset))
+
+
+@pytest.mark.parametrize("values", [
+    {"at_gap": "100"},
+    {"prev_rb_coin": "REG"},
+    {"custom_condition": "条件あり"},
+    {"game": "25"},
+    {"prev_diff_min": "-500"},
+])
+def test_unsupported_forms_fall_back(machine, values):
+    view, settings, dataset, cube = machine
+    assert cube.lookup(filter_form(view, **values), settings) is None
+
+
+def test_locked_fields_are_ignored(machine):
+    # ロックされた項目は値があっても条件にしない（キューブで引ける）
+    view, settings, dataset, cube = machine
+    form = filter_form(view, at_gap="100", locked_ui_fields="at_gap")
+    agg = cube.lookup(form, settings)
+    assert agg is not None
+    assert_same(agg, slot_app.compile_filter_plan(form, settings).aggregate(dataset))
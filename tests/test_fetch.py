@@ -0,0 +1,52 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from preview import fetch
+from preview.fetch import fetch_link_meta
+
+HEAD = b"<html><head><title>t</title><meta property='og:title' content='OG'></head><body>"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_GET(self):
+        size = int(self.path.rsplit("/", 1)[-1])
+        body = HEAD + b"x" * size + b"</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.connections = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_small_body_is_drained_and_connection_reused(server):
+    for _ in range(3):
+        assert fetch_link_meta(f"{server}/{32 * 1024}")["title"] == "OG"
+    assert Handler.connections == 1
+
+
+def test_large_body_is_not_read(server):
+    for _ in range(2):
+        assert fetch_link_meta(f"{server}/{fetch.MAX_DRAIN_BYTES * 4}")["title"] == "OG"
+    assert Handler.connections == 2
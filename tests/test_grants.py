@@ -0,0 +1,48 @@
+from auth.grants import GrantIndex
+
+KEYS = ["hokuto:paid", "godeater:paid", "magireco:paid"]
+
+
+def test_grant_and_has():
+    index = GrantIndex(KEYS)
+    token = index.grant(None, "godeater:paid")
+    assert index.has(token, "godeater:paid")
+    assert not index.has(token, "hokuto:paid")
+
+
+def test_grants_survive_appended_keys():
+    token = GrantIndex(KEYS).grant(None, "magireco:paid")
+    token = GrantIndex(KEYS).grant(token, "hokuto:paid")
+
+    appended = GrantIndex(KEYS + ["tekken6:paid", "bigdream:paid"])
+    assert appended.has(token, "magireco:paid")
+    assert appended.has(token, "hokuto:paid")
+    assert not appended.has(token, "godeater:paid")
+    assert not appended.has(token, "tekken6:paid")
+
+    # 追加後に再発行すると新しい版になり、以前の利用権も引き継ぐ
+    token = appended.grant(token, "tekken6:paid")
+    assert token.startswith(appended.version + ".")
+    assert appended.has(token, "magireco:paid") and appended.has(token, "tekken6:paid")
+
+
+def test_extra_bits_beyond_issued_prefix_are_ignored():
+    # 追加前の版に、その時点で存在しなかったビットが立っていても許可しない
+    old = GrantIndex(KEYS)
+    forged = f"{old.version}.{0b11111:x}"
+    appended = GrantIndex(KEYS + ["tekken6:paid", "bigdream:paid"])
+    assert not appended.has(forged, "tekken6:paid")
+    assert appended.has(forged, "hokuto:paid")
+
+
+def test_reordered_or_inserted_keys_invalidate_grants():
+    token = GrantIndex(KEYS).grant(None, "godeater:paid")
+    assert not GrantIndex(list(reversed(KEYS))).has(token, "godeater:paid")
+    assert not GrantIndex(["tekken6:paid"] + KEYS).has(token, "godeater:paid")
+    assert not GrantIndex(KEYS[:1] + KEYS[2:]).has(token, "magireco:paid")
+
+
+def test_legacy_dict_form():
+    index = GrantIndex(KEYS)
+    assert index.has({"hokuto:paid": True}, "hokuto:paid")
+    assert not index.has({"hokuto:paid": False}, "hokuto:paid")
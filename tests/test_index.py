@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from datastore.columnar import ALL_DTYPES, read_table
+from datastore.index import BitmapIndex, ScanQuery
+
+HEADER = list(ALL_DTYPES) + ["前回種別", "機種別条件"]
+
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=HEADER).to_csv(path, index=False)
+    return str(path)
+
+
+def sample_rows(n=200):
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(n):
+        row = {name: int(rng.integers(0, 5)) for name in ALL_DTYPES}
+        row["当該REGゲーム数"] = int(rng.integers(0, 1000))
+        row["前回種別"] = ["下位", "上位", ""][i % 3] or None
+        row["機種別条件"] = i % 4
+        rows.append(row)
+    return rows
+
+
+def check_against_scan(df):
+    index = BitmapIndex(df)
+    for column, value in [
+        ("前回種別", "下位"),
+        ("前回種別", "上位"),
+        ("前回種別", "存在しない"),
+        ("機種別条件", 2),
+        ("スルー回数", 3),
+        ("朝イチ", 0),
+    ]:
+        q = index.query()
+        q.eq(column, value)
+        scan = ScanQuery(df)
+        scan.eq(column, value)
+        assert np.array_equal(q.mask(), scan.mask().to_numpy()), (column, value)
+
+
+def test_index_from_plain_read_csv(tmp_path):
+    # バンドルが無い新規チェックアウトと同じく、文字列列が object/str のまま
+    path = write_csv(tmp_path / "at.csv", sample_rows())
+    df = pd.read_csv(path, dtype=ALL_DTYPES)
+    assert not isinstance(df["前回種別"].dtype, pd.CategoricalDtype)
+    check_against_scan(df)
+
+
+def test_index_from_csv_fallback(tmp_path):
+    # read_table はバンドルが無ければCSVを読む
+    path = write_csv(tmp_path / "at.csv", sample_rows())
+    check_against_scan(read_table(path, dtypes=ALL_DTYPES))
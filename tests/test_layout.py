@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore.cube import AGG_COLUMNS
+from datastore.dataset import Dataset
+from datastore.index import BitmapIndex
+from datastore.layout import SORT_COLUMN, SortedQuery
+from datastore.plan import QueryPlan
+
+EXCLUDE_GAMES = 30
+
+PREDS = [
+    [],
+    [("eq", "朝イチ", 1)],
+    [("eq", "朝イチ", 0), ("eq", "スルー回数", 2)],      # PrefixSums だけで引ける
+    [("eq", "朝イチ", 0), ("eq", "前回種別", "上位")],   # ビットマップ
+    [("between", "前回差枚数", -100, 100), ("le", "前回連荘数", 2)],
+]
+
+
+def sample_frame(n=500):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        "朝イチ": rng.integers(0, 2, n).astype(np.int8),
+        "スルー回数": rng.integers(0, 4, n).astype(np.int16),
+        "前回連荘数": rng.integers(1, 5, n).astype(np.int16),
+        "前回差枚数": rng.integers(-300, 300, n).astype(np.int32),
+        "前回種別": pd.Series(rng.choice(["下位", "上位"], n)).astype("category"),
+        SORT_COLUMN: rng.integers(0, 300, n).astype(np.int32),
+        "REGゲーム数": rng.random(n).astype(np.float32) * 500,
+        "ATゲーム数": rng.random(n).astype(np.float32) * 100,
+        "REG枚数": rng.random(n).astype(np.float32) * 50,
+        "AT枚数": rng.random(n).astype(np.float32) * 800,
+    })
+
+
+def brute_force(df, preds, threshold):
+    mask = np.ones(len(df), dtype=bool)
+    for op, column, *args in preds:
+        values = df[column]
+        if op == "eq":
+            mask &= (values == args[0]).to_numpy()
+        elif op == "le":
+            mask &= (values <= args[0]).to_numpy()
+        elif op == "ge":
+            mask &= (values >= args[0]).to_numpy()
+        else:
+            mask &= ((values >= args[0]) & (values <= args[1])).to_numpy()
+    if threshold is not None:
+        mask &= (df[SORT_COLUMN] >= threshold).to_numpy()
+    sums = np.array([df[c].to_numpy()[mask].sum(dtype=np.float64) for c in AGG_COLUMNS])
+    return int(mask.sum()), sums
+
+
+def assert_agg(agg, expected):
+    assert agg.count == expected[0]
+    np.testing.assert_allclose(agg.sums, expected[1], rtol=1e-9)
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return Dataset(sample_frame())
+
+
+@pytest.mark.parametrize("preds", PREDS)
+@pytest.mark.parametrize("threshold", [None, 0, EXCLUDE_GAMES, 150, 299, 1000])
+def test_aggregate_matches_brute_force(dataset, preds, threshold):
+    assert dataset.prefix is not None
+    agg = QueryPlan(preds, threshold).aggregate(dataset)
+    assert_agg(agg, brute_force(dataset.frame, preds, threshold))
+
+
+@pytest.mark.parametrize("preds", PREDS)
+def test_aggregate_without_prefix_sums(preds):
+    # 並べ替えていないフレーム（PrefixSums なし）はビットマップだけで集計する
+    df = sample_frame()
+    q = SortedQuery(df, BitmapIndex(df), None)
+    QueryPlan(preds, 150).apply(q)
+    assert_agg(q.aggregate(), brute_force(df, preds, 150))
+
+
+EDGES = [0, 10, EXCLUDE_GAMES - 1, EXCLUDE_GAMES, 31, 100, 299, 300, 1000]
+
+
+@pytest.mark.parametrize("preds", PREDS)
+def test_sweep_matches_per_game_brute_force(dataset, preds):
+    # しきい値が exclude_games 未満なら exclude_games で、最大値より上なら0件
+    aggs = QueryPlan(preds, EXCLUDE_GAMES).sweep(dataset, EDGES)
+    assert len(aggs) == len(EDGES)
+    for edge, agg in zip(EDGES, aggs):
+        assert_agg(agg, brute_force(dataset.frame, preds, max(edge, EXCLUDE_GAMES)))
+
+
+@pytest.mark.parametrize("preds", PREDS)
+def test_sweep_without_prefix_sums(preds):
+    df = sample_frame()
+    q = SortedQuery(df, BitmapIndex(df), None)
+    QueryPlan(preds).apply(q)
+    for edge, agg in zip(EDGES, q.sweep(EDGES)):
+        assert_agg(agg, brute_force(df, preds, edge))
@@ -0,0 +1,86 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app as slot_app
+from config.settings import SettingsError, parse_condition_label
+from datastore.layout import SORT_COLUMN
+from datastore.plan import PlanBuilder, QueryPlan
+
+
+def test_key_ignores_predicate_order_and_duplicates():
+    a = QueryPlan([("eq", "朝イチ", 0), ("le", "前回連荘数", 2)], 40)
+    b = QueryPlan([("le", "前回連荘数", 2), ("eq", "朝イチ", 0), ("eq", "朝イチ", 0)], 40)
+    assert a.key == b.key and a == b and hash(a) == hash(b)
+    assert a.key != QueryPlan(a.preds, 41).key
+    assert a.key != QueryPlan([("eq", "朝イチ", 1), ("le", "前回連荘数", 2)], 40).key
+
+
+def test_builder_keeps_highest_threshold():
+    builder = PlanBuilder()
+    builder.ge(SORT_COLUMN, 40)
+    builder.ge("スルー回数", 2)
+    builder.ge(SORT_COLUMN, 100)
+    plan = builder.build()
+    assert plan.threshold == 100
+    assert plan.preds == (("ge", "スルー回数", 2),)
+
+
+def all_plan(machine, **values):
+    view = slot_app.ALL_VIEWS[machine]
+    form = slot_app.build_filter_form(slot_app.parse_all_form(MultiDict(values), view))
+    return slot_app.compile_filter_plan(form, view["settings"])
+
+
+def test_equal_all_forms_share_a_key():
+    machine = "lotis"
+    base = all_plan(machine, time="朝イチ以外", game="100")
+    # 書き方が違うだけの同じ条件
+    assert all_plan(machine, time="朝イチ以外", game="100", through="0").key == base.key
+    assert all_plan(machine, time="朝イチ以外", game="100", through="x").key == base.key
+    assert (
+        all_plan(machine, time="朝イチ以外", game="100", through="不問").key
+        == all_plan(machine, time="朝イチ以外", game="100", through="all").key
+    )
+    assert all_plan(machine, time="朝イチ以外", game="100", lend_medals="46").key == base.key
+    assert all_plan(machine, time="朝イチ以外", game="100", at_gap="100", locked_ui_fields="at_gap").key == base.key
+    # 条件が違えば別のキー
+    others = [
+        all_plan(machine, time="朝イチ", game="100"),
+        all_plan(machine, time="朝イチ以外", game="150"),
+        all_plan(machine, time="朝イチ以外", game="100", through="1"),
+        all_plan(machine, time="朝イチ以外", game="100", through="不問"),
+        all_plan(machine, time="朝イチ以外", game="100", at_gap="100"),
+        all_plan(machine, time="朝イチ以外", game="100", prev_rb_coin="REG"),
+    ]
+    assert len({base.key, *(p.key for p in others)}) == len(others) + 1
+
+
+def test_equal_legacy_forms_share_a_key():
+    settings = slot_app.LEGACY_SETTINGS[slot_app.machine_configs["hokuto"]["display_name"]]
+    columns = ["前回種別", "機種別条件"]
+    base = {"time": "朝イチ以外", "game": "100", "prev_type": "不問", "prev_game": "1～400G"}
+
+    def key(**changes):
+        return slot_app.compile_legacy_plan(dict(base, **changes), settings, columns).key
+
+    assert key() == key(through="不問", at_gap=None)
+    assert key() != key(prev_game="401～800G")
+    assert key() != key(game="150")
+    assert key() != key(time="朝イチ")
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("1～500G", ("between", 1, 500)),
+    ("5スルー以上", ("ge", 5)),
+    ("-2,001枚以下", ("le", -2001)),
+    ("0スルー", ("eq", 0)),
+    ("2～5連", ("between", 2, 5)),
+])
+def test_parse_condition_label(label, expected):
+    assert parse_condition_label(label) == expected
+
+
+@pytest.mark.parametrize("label", ["", "不明", "1～", "～500G", "1～2～3"])
+def test_parse_condition_label_rejects_malformed(label):
+    with pytest.raises(SettingsError):
+        parse_condition_label(label)
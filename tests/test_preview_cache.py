@@ -0,0 +1,51 @@
+import threading
+
+from preview.cache import PreviewCache
+from preview.store import PreviewStore
+
+URL = "https://example.com/a"
+
+
+class SlowStore(PreviewStore):
+    """
+    get() が呼ばれたスレッドを記録し、release されるまで返さない
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.release = threading.Event()
+        self.threads = []
+
+    def get(self, url):
+        self.threads.append(threading.current_thread().name)
+        self.release.wait(5)
+        return super().get(url)
+
+
+def test_get_does_not_wait_on_store(tmp_path):
+    store = SlowStore(str(tmp_path / "previews.sqlite3"))
+    store.put(URL, {"title": "stored"}, expires=10**10, ok=True, fetched_at=0)
+    fetched = []
+    cache = PreviewCache(fetch=lambda url: fetched.append(url) or {"title": "fetched"}, store=store)
+
+    # ストアが詰まっていても get() はすぐ返る（手元に無いので None）
+    assert cache.get(URL) is None
+    assert cache.stats()["misses"] == 1
+
+    store.release.set()
+    cache._executor.shutdown(wait=True)
+    # 裏の取得がストアの値を手元に入れ、ネットワークには行かない
+    assert store.threads and all(name.startswith("preview") for name in store.threads)
+    assert fetched == []
+    assert cache.get(URL) == {"title": "stored"}
+    assert cache.stats()["pending"] == 0
+
+
+def test_expired_store_value_is_fetched(tmp_path):
+    store = PreviewStore(str(tmp_path / "previews.sqlite3"))
+    store.put(URL, {"title": "old"}, expires=1, ok=True, fetched_at=0)
+    cache = PreviewCache(fetch=lambda url: {"title": "fetched"}, store=store)
+
+    cache.refresh(URL).result()
+    assert cache.get(URL) == {"title": "fetched"}
+    assert store.get(URL)[0] == {"title": "fetched"}
@@ -0,0 +1,53 @@
+import os
+import pickle
+import subprocess
+import sys
+
+from config.compiled import LazyTable
+from preview.cache import PreviewCache
+from preview.prewarm import collect_urls
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Config:
+    COMMON_LINKS = [{"link_url": "https://example.com/common"}]
+
+    def __init__(self, machine_configs):
+        self.machine_configs = machine_configs
+
+
+def test_collect_urls_does_not_materialize_configs():
+    values = {
+        "hokuto": {"links": [{"link_url": "https://example.com/hokuto"}]},
+        "godeater": {"links": [{"link_url": "https://example.com/common"}]},
+    }
+    table = LazyTable({k: pickle.dumps(v) for k, v in values.items()}, {k: {} for k in values})
+
+    urls = collect_urls(_Config(table))
+    assert urls == ["https://example.com/common", "https://example.com/hokuto"]
+    assert table.stats()["materialized"] == 0
+
+
+def test_import_starts_no_preview_threads():
+    # 取得スレッドは worker 起動後（post_worker_init）に作る。import だけでは何も始めない
+    env = dict(os.environ, PREVIEW_PREWARM="1", DATA_RELOAD_INTERVAL="0", RATE_LIMIT_DB="memory")
+    code = (
+        "import app;"
+        "assert app.PREVIEW_CACHE._executor is None;"
+        "assert not app.PREVIEW_CACHE._pending;"
+        "assert app.new_config.machine_configs.stats()['materialized'] == 0"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def test_refresh_drops_pending_inherited_from_parent():
+    cache = PreviewCache(fetch=lambda url: {"title": url})
+    # fork 直後の状態：親で取得中だったURLが _pending に残り、pid が変わっている
+    cache._pending.add("https://example.com/a")
+    cache._pid = -1
+
+    future = cache.refresh("https://example.com/a")
+    assert future is not None
+    future.result()
+    assert cache.get("https://example.com/a") == {"title": "https://example.com/a"}
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import app as slot_app
+from auth.ratelimit import RateLimiter, SQLiteBackend
+
+
+def test_sqlite_limit_is_shared_between_processes(tmp_path):
+    # worker ごとに別の接続（別インスタンス）でも同じファイルなら回数は合算される
+    path = str(tmp_path / "ratelimit.sqlite3")
+    clock = lambda: 1000.0
+    first = RateLimiter(SQLiteBackend(path), capacity=5, refill_seconds=300, clock=clock)
+    second = RateLimiter(SQLiteBackend(path), capacity=5, refill_seconds=300, clock=clock)
+
+    for limiter in (first, second, first, second, first):
+        assert limiter.locked_until("ip|hokuto:paid") is None
+        limiter.fail("ip|hokuto:paid")
+    assert first.locked_until("ip|hokuto:paid") is not None
+    assert second.locked_until("ip|hokuto:paid") is not None
+
+
+def test_sqlite_prunes_refilled_buckets(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteBackend, "PRUNE_EVERY", 3)
+    backend = SQLiteBackend(str(tmp_path / "ratelimit.sqlite3"))
+    now = [1000.0]
+    limiter = RateLimiter(backend, capacity=5, refill_seconds=300, clock=lambda: now[0])
+
+    limiter.fail("ip1|hokuto:paid")
+    limiter.fail("ip2|hokuto:paid")
+    # 満タンに戻った後の3回目で古い2行は消え、直前に失敗したものだけ残る
+    now[0] += 300
+    limiter.fail("ip3|hokuto:paid")
+    conn = sqlite3.connect(backend.path)
+    try:
+        keys = [row[0] for row in conn.execute("SELECT key FROM buckets")]
+    finally:
+        conn.close()
+    assert keys == ["ip3|hokuto:paid"]
+    assert limiter.locked_until("ip1|hokuto:paid") is None
+
+
+def test_app_limiter_defaults_to_sqlite():
+    assert isinstance(slot_app.LOGIN_LIMITER.backend, SQLiteBackend)
+
+
+def test_login_limit_keys_on_proxied_remote_addr():
+    machine_key, plan_type = "hokuto", next(iter(slot_app.TOOL_PASSWORDS["hokuto"]))
+    url = f"/{machine_key}/{plan_type}/login"
+    client = slot_app.app.test_client()
+    proxy = {"REMOTE_ADDR": "10.0.0.1"}
+
+    def attempt(forwarded):
+        return client.post(
+            url, data={"password": "x"},
+            headers={"X-Forwarded-For": forwarded}, environ_base=proxy,
+        ).get_data(as_text=True)
+
+    # 先頭のホップは偽装できる。信用するのは末尾の1段（プロキシが付けた接続元）だけ
+    for i in range(slot_app.MAX_TRIES):
+        assert "ロック中" not in attempt(f"198.51.100.{i}, 203.0.113.9")
+    assert "ロック中" in attempt("198.51.100.99, 203.0.113.9")
+    # 別の接続元は影響を受けない
+    assert "ロック中" not in attempt("203.0.113.10")
+
+
+def test_forwarded_for_is_ignored_by_default(tmp_path):
+    # TRUSTED_PROXY_HOPS を設定しない環境では、X-Forwarded-For を変えても同じバケットに数える
+    env = {k: v for k, v in os.environ.items() if k != "TRUSTED_PROXY_HOPS"}
+    env["RATE_LIMIT_DB"] = str(tmp_path / "ratelimit.sqlite3")
+    code = (
+        "import app\n"
+        "assert app.TRUSTED_PROXY_HOPS == 0\n"
+        "client = app.app.test_client()\n"
+        "def attempt(i):\n"
+        "    return client.post('/all/login', data={'password': 'x'},"
+        " headers={'X-Forwarded-For': f'198.51.100.{i}'}).get_data(as_text=True)\n"
+        "for i in range(app.MAX_TRIES):\n"
+        "    assert 'ロック中' not in attempt(i)\n"
+        "assert 'ロック中' in attempt(99)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=slot_app.app.root_path, env=env, check=True)
+
+
+def test_unusable_db_does_not_break_login(tmp_path, monkeypatch, capsys):
+    # 開けない場所でも作成時には失敗せず、ログインは制限なしで続く（fail-open）
+    backend = SQLiteBackend(str(tmp_path / "missing" / "ratelimit.sqlite3"))
+    monkeypatch.setattr(slot_app.LOGIN_LIMITER, "backend", backend)
+
+    wrong = "000000" if slot_app.NEW_TOOL_PASSWORD != "000000" else "000001"
+    client = slot_app.app.test_client()
+    for _ in range(slot_app.MAX_TRIES + 1):
+        resp = client.post("/all/login", data={"password": wrong})
+        assert resp.status_code == 200
+        assert "ロック中" not in resp.get_data(as_text=True)
+    assert "[ratelimit]" in capsys.readouterr().err
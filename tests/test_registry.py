@@ -0,0 +1,92 @@
+import pytest
+
+from datastore import registry as registry_mod
+from datastore.cache import DatasetCache
+from datastore.registry import DatasetRegistry
+from test_cache import make_frame
+
+PATH = "data/hokuto/at.csv"
+
+
+@pytest.fixture
+def source(monkeypatch):
+    """
+    ファイルの版（mtime）と読み込み結果を差し替える
+    """
+    state = {"mtime": 1.0, "fail": False, "reads": 0}
+
+    def source_mtime(path):
+        return state["mtime"]
+
+    def read_table(path, dtypes=None):
+        state["reads"] += 1
+        if state["fail"]:
+            raise ValueError("書き込み途中")
+        return make_frame(50, seed=int(state["mtime"]))
+
+    monkeypatch.setattr(registry_mod, "source_mtime", source_mtime)
+    monkeypatch.setattr(registry_mod, "read_table", read_table)
+    return state
+
+
+@pytest.fixture
+def registry():
+    return DatasetRegistry(DatasetCache(1 << 30), interval=0)
+
+
+def test_swaps_after_two_sightings(source, registry):
+    old = registry.get(PATH)
+    source["mtime"] = 2.0
+
+    # 1回目は見ただけ（書き込み途中かもしれない）
+    assert registry.poll() == 0
+    assert registry.get(PATH) is old
+    # 同じ版を2回続けて見たら読み込んで差し替える
+    assert registry.poll() == 1
+    assert registry.get(PATH).version == 2.0
+    assert registry.generation == 1
+    assert registry.poll() == 0
+
+
+def test_version_still_changing_is_not_loaded(source, registry):
+    old = registry.get(PATH)
+    reads = source["reads"]
+    for mtime in (2.0, 3.0, 4.0):
+        source["mtime"] = mtime
+        assert registry.poll() == 0
+    assert registry.get(PATH) is old
+    assert source["reads"] == reads
+
+
+def test_failed_load_keeps_previous_version(source, registry):
+    old = registry.get(PATH)
+    source["mtime"] = 2.0
+    source["fail"] = True
+    registry.poll()
+    assert registry.poll() == 0
+    assert registry.get(PATH) is old
+    assert registry.failures == 1
+    assert "書き込み途中" in registry.last_error
+
+    # 失敗した版は再試行しない
+    reads = source["reads"]
+    registry.poll()
+    registry.poll()
+    assert source["reads"] == reads and registry.failures == 1
+
+    # 次の版は読める
+    source["mtime"] = 3.0
+    source["fail"] = False
+    registry.poll()
+    assert registry.poll() == 1
+    assert registry.get(PATH).version == 3.0
+
+
+def test_evicted_path_is_no_longer_watched(source, registry):
+    registry.get(PATH)
+    registry.cache.clear()
+    source["mtime"] = 2.0
+    registry.poll()
+    assert registry.stats()["watched"] == 0
+    # 次に使われたときに最新の版を読む
+    assert registry.get(PATH).version == 2.0
@@ -0,0 +1,76 @@
+import pytest
+
+from config.settings import (
+    RANGE_FALLBACKS,
+    SettingsError,
+    normalize_settings,
+    parse_game,
+    parse_range,
+)
+
+
+@pytest.mark.parametrize("value, low, high, options", [
+    # 3項目: 初期値のみ（選択肢なし）
+    ((0, 1000, 50), 0, 1000, ()),
+    # 4項目: 最大側に final_max を追加
+    ((0, 200, 100, 999), 0, 999, (0, 100, 200, 999)),
+    ((0, 200, 100, 200), 0, 200, (0, 100, 200)),
+    # 5項目: 両端に final_min / final_max
+    ((0, 200, 100, -500, 999), -500, 999, (-500, 0, 100, 200, 999)),
+    ((-200, 200, 200, -200, 200), -200, 200, (-200, 0, 200)),
+    ([0, 100, 50], 0, 100, ()),
+])
+def test_parse_range(value, low, high, options):
+    r = parse_range("prev_diff", value)
+    assert (r.min, r.max, r.options) == (low, high, options)
+    assert (r.start, r.normal_max, r.step) == tuple(value[:3])
+
+
+@pytest.mark.parametrize("value", [
+    (0, 100),                  # 項目数
+    (0, 100, 10, 1, 2, 3),
+    "0-100",
+    (0, 100, 0),               # step が0
+    (0, 100, -10),
+    (100, 0, 10),              # start > normal_max
+    (0, 100.5, 10),            # 整数以外
+    (0, True, 1),
+    (0, 100, 10, 500, -500),   # final_min > final_max
+    None,
+])
+def test_parse_range_rejects_malformed(value):
+    with pytest.raises(SettingsError, match="prev_diff"):
+        parse_range("prev_diff", value)
+
+
+def test_parse_game():
+    r = parse_game((0, 200, 50, 9999, 1000))
+    assert r.options == (50, 100, 150, 200, 1000)
+    assert (r.min, r.max) == (50, 1000)
+    with pytest.raises(SettingsError, match="game"):
+        parse_game((0, 200, 50))
+
+
+def test_normalize_settings_fills_defaults():
+    settings = normalize_settings({"mode_options": ["AT"]})
+    assert settings["exclude_games"] == 0
+    assert settings["time_options"] == ("朝イチ", "朝イチ以外")
+    assert dict(settings["prev_rb_coin"]) == {"不問": None}
+    for field, fallback in RANGE_FALLBACKS.items():
+        assert settings[field] == parse_range(field, fallback)
+    with pytest.raises(TypeError):
+        settings["exclude_games"] = 1
+
+
+@pytest.mark.parametrize("settings, field", [
+    ({"exclude_games": "40"}, "exclude_games"),
+    ({"coin_moti": 0}, "coin_moti"),
+    ({"mode_options": "AT"}, "mode_options"),
+    ({"time_options": []}, "time_options"),
+    ({"at_gap": (0, 1000)}, "at_gap"),
+    ({"prev_rb_coin": {"REG": (100, 0)}}, "prev_rb_coin"),
+    ({"prev_rb_coin": [("REG", (0, 100))]}, "prev_rb_coin"),
+])
+def test_normalize_settings_rejects_malformed(settings, field):
+    with pytest.raises(SettingsError, match=field):
+        normalize_settings(settings)
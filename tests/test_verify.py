@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+from auth.verify import VerifyBusy, VerifyPool
+
+
+def test_verify_busy_when_queue_is_full():
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def check(pw_hash, password):
+        started.release()
+        release.wait(5)
+        return True
+
+    pool = VerifyPool(secret=b"s", max_workers=1, max_queue=1, check=check)
+    threads = [threading.Thread(target=pool.verify, args=("h", f"pw{i}")) for i in range(2)]
+    for t in threads:
+        t.start()
+    assert started.acquire(timeout=5)
+    # 1件は計算中、もう1件は待ち行列に入るまで待つ
+    deadline = time.monotonic() + 5
+    while pool.pending < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    try:
+        with pytest.raises(VerifyBusy):
+            pool.verify("h", "pw2")
+    finally:
+        release.set()
+        for t in threads:
+            t.join()
+    assert pool.rejected == 1
+    assert pool.completed == 2
+
+
+def test_default_pool_leaves_a_request_thread_free():
+    import app as slot_app
+
+    pool = slot_app.VERIFY_POOL
+    assert pool.max_workers + pool.max_queue == slot_app.GUNICORN_THREADS - 1
@@ -0,0 +1,26 @@
+import app as slot_app
+
+
+def test_warm_up_respects_cache_budget(monkeypatch):
+    cache = slot_app.DATA_CACHE
+    cache.clear()
+    monkeypatch.setattr(cache, "max_bytes", 32 * 1024 * 1024)
+    monkeypatch.setattr(slot_app, "WARM_UP_STATE", {"ready": False, "seconds": None, "machines": []})
+    # 他のテストで展開済みの分は数えない
+    for table in (slot_app.new_config.machine_configs, slot_app.machine_settings):
+        monkeypatch.setattr(table, "_values", {})
+    monkeypatch.setattr(slot_app, "_machine_configs_asset", None)
+
+    state = slot_app.warm_up()
+    stats = cache.stats()
+
+    assert state["ready"]
+    assert stats["entries"] > 0
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["pinned"] == 0
+    # 上限に達したら残りは読まない
+    assert sum(m["skipped"] for m in state["machines"]) > 0
+    # 機種設定は展開しない（JS配信用の本文も含めて）
+    assert slot_app.new_config.machine_configs.stats()["materialized"] == 0
+    assert slot_app.machine_settings.stats()["materialized"] == 0
+    cache.clear()